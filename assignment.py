@@ -0,0 +1,136 @@
+# incremental assignment of TAs to their closest car stop
+
+import numpy as np
+
+class DropoffAssignment:
+	"""
+	Tracks, for every TA, the nearest and second-nearest vertex the car stops at, so the walking cost
+	of adding or removing a stop can be found in O(1) per TA. Changes are journaled until commit()
+	and can be undone with rollback().
+	"""
+
+	def __init__(self, dist, home_indices, stops=()):
+		"""
+		Input:
+			dist: All-pairs shortest distance matrix
+			home_indices: The indices of the vertices that are TA homes
+			stops: Vertices the car stops at initially, in car path order (ties go to the earliest)
+		"""
+		self.home_indices = list(home_indices)
+
+		# to_homes[v][k] is the distance from v to the kth TA's home
+		self.to_homes = np.asarray(dist)[:, self.home_indices]
+
+		# number of times each vertex appears among the stops
+		self.counts = {}
+
+		num_homes = len(self.home_indices)
+		self.nearest = np.full(num_homes, -1)
+		self.nearest_dist = np.full(num_homes, np.inf)
+		self.second = np.full(num_homes, -1)
+		self.second_dist = np.full(num_homes, np.inf)
+
+		self.journal = []
+		for v in stops:
+			self.add(v)
+		self.commit()
+
+	@property
+	def cost(self):
+		""" Total walking cost, summed in home order """
+		return sum(self.nearest_dist.tolist())
+
+	def delta_add(self, v):
+		""" Change in walking cost if the car also stops at v """
+		return float(np.minimum(self.to_homes[v] - self.nearest_dist, 0).sum())
+
+	def delta_remove(self, v):
+		""" Change in walking cost if the car no longer stops at v """
+		if self.counts.get(v, 0) != 1:
+			return 0.0
+		moved = self.nearest == v
+		return float((self.second_dist[moved] - self.nearest_dist[moved]).sum())
+
+	def nearest_without(self, v):
+		""" Distance from every home to its nearest stop other than v """
+		if self.counts.get(v, 0) > 1:
+			return self.nearest_dist
+		return np.where(self.nearest == v, self.second_dist, self.nearest_dist)
+
+	def add(self, v):
+		""" The car also stops at v """
+		self.journal.append(("count", v, self.counts.get(v, 0)))
+		self.counts[v] = self.counts.get(v, 0) + 1
+		if self.counts[v] > 1:
+			return
+
+		self.save()
+		d = self.to_homes[v]
+		closer = d < self.nearest_dist
+		between = ~closer & (d < self.second_dist)
+
+		self.second[closer] = self.nearest[closer]
+		self.second_dist[closer] = self.nearest_dist[closer]
+		self.nearest[closer] = v
+		self.nearest_dist[closer] = d[closer]
+		self.second[between] = v
+		self.second_dist[between] = d[between]
+
+	def remove(self, v):
+		""" The car stops at v one time fewer """
+		self.journal.append(("count", v, self.counts[v]))
+		self.counts[v] -= 1
+		if self.counts[v] > 0:
+			return
+		del self.counts[v]
+
+		self.save()
+		moved = self.nearest == v
+		self.nearest[moved] = self.second[moved]
+		self.nearest_dist[moved] = self.second_dist[moved]
+
+		# only homes that lost their first or second choice need a new second choice
+		stale = np.flatnonzero(moved | (self.second == v))
+		if not len(stale):
+			return
+		stops = np.array(list(self.counts), dtype=int)
+		d = self.to_homes[np.ix_(stops, stale)]
+		d[stops[:, None] == self.nearest[stale]] = np.inf
+		if not len(stops):
+			self.second[stale] = -1
+			self.second_dist[stale] = np.inf
+			return
+		best = d.argmin(axis=0)
+		self.second_dist[stale] = d[best, np.arange(len(stale))]
+		self.second[stale] = np.where(np.isinf(self.second_dist[stale]), -1, stops[best])
+
+	def save(self):
+		""" Journal the per-home arrays before they change """
+		self.journal.append(("arrays", self.nearest.copy(), self.nearest_dist.copy(), self.second.copy(), self.second_dist.copy()))
+
+	def commit(self):
+		""" Keep every change made since the last commit """
+		self.journal = []
+
+	def rollback(self):
+		""" Undo every change made since the last commit """
+		while self.journal:
+			entry = self.journal.pop()
+			if entry[0] == "count":
+				v, count = entry[1], entry[2]
+				if count:
+					self.counts[v] = count
+				else:
+					self.counts.pop(v, None)
+			else:
+				self.nearest, self.nearest_dist, self.second, self.second_dist = entry[1:]
+
+	def dropoffs(self):
+		"""
+		Output:
+			A dictionary mapping drop-off location to a list of homes of TAs that got off at that particular location
+		"""
+		dropoffs = {}
+		for home, dropoff in zip(self.home_indices, self.nearest.tolist()):
+			dropoffs.setdefault(dropoff, []).append(home)
+		return dropoffs
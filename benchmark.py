@@ -0,0 +1,163 @@
+# compares ILP formulations on build time, memory and time-to-optimal
+
+import os
+import re
+import argparse
+import multiprocessing
+import queue
+import resource
+import time
+import score
+from input_cache import read_input
+from run_log import capture_output
+from student_utils import *
+from solver_toolbox import ILPSolver, OptimizationStatus
+
+DEFAULT_INPUTS = ['batches/inputs/1_50.in', 'batches/inputs/1_100.in', 'batches/inputs/1_200.in']
+
+# formulation name -> keyword arguments for ILPSolver
+FORMULATIONS = {
+	"flow": {"formulation": "flow"},
+	"assign": {"formulation": "assign"},
+	"flow-cuts": {"formulation": "flow", "lazy_cuts": True},
+	"assign-cuts": {"formulation": "assign", "lazy_cuts": True},
+	"flow-lemmas": {"formulation": "flow", "lemmas": ("walk", "closest")},
+	"assign-lemmas": {"formulation": "assign", "lemmas": ("closest",)},
+}
+
+def hard_inputs(count):
+	"""
+	Input:
+		count: How many inputs to return
+	Output:
+		Paths of the count inputs with the worst scores in score.py
+	"""
+	ranked = sorted(score.dmg, reverse=True)
+	paths = ['batches/inputs/{}.in'.format(name) for ratio, name in ranked]
+	return [path for path in paths if os.path.exists(path)][:count]
+
+def optimize_counting_nodes(model, optimize):
+	"""
+	Run optimize with the solver's log captured, since python-mip doesn't report the size of the search tree.
+	Input:
+		model: The MIP model
+		optimize: Function solving the model
+	Output:
+		What optimize returns
+		Number of branch-and-bound nodes enumerated over every solve it ran, or None if the log doesn't say
+	"""
+	model.verbose = 1
+	with capture_output() as log:
+		result = optimize()
+	matches = re.findall(r'Enumerated nodes:\s+(\d+)', log[0])
+	return result, sum(int(match) for match in matches) if matches else None
+
+def run_formulation(input_file, name, timeout, results):
+	"""
+	Build and solve one input with one formulation, in its own process so memory is measured in isolation.
+	Input:
+		input_file: path to the .in file
+		name: key into FORMULATIONS
+		timeout: seconds given to the MIP
+		results: multiprocessing queue receiving the stats dictionary
+	"""
+	num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = read_input(input_file)
+	G, message = adjacency_matrix_to_graph(adjacency_matrix)
+	home_indices = list_locations.indices(list_houses)
+	starting_car_index = list_locations.index(starting_car_location)
+
+	solver = ILPSolver(**FORMULATIONS[name])
+
+	rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+	build_start = time.time()
+	model, variables = solver.build_model(G, home_indices, starting_car_index, solver.lazy_cuts, solver.lemmas)
+	build_time = time.time() - build_start
+	rss_built = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+	# a model without car flow only has a connected tour once optimize_connected is done with it
+	if solver.lazy_cuts:
+		optimize = lambda: solver.optimize_connected(model, variables["x"], G, starting_car_index, timeout)
+	else:
+		optimize = lambda: (model.optimize(max_seconds=timeout), model.objective_bound)
+
+	solve_start = time.time()
+	(status, bound), nodes = optimize_counting_nodes(model, optimize)
+	solve_time = time.time() - solve_start
+	peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+	# bound after the root node's cutting planes, on a separate copy of the model built once everything else is measured,
+	# since ru_maxrss is a high-water mark
+	root_model, root_variables = solver.build_model(G, home_indices, starting_car_index, solver.lazy_cuts, solver.lemmas)
+	root_model.verbose = 0
+	root_model.optimize(max_seconds=timeout, max_nodes=1)
+	root_bound = root_model.objective_bound
+
+	results.put({
+		"input": input_file.split('/')[-1],
+		"formulation": name,
+		"cols": model.num_cols,
+		"rows": model.num_rows,
+		"nz": model.num_nz,
+		"build": build_time,
+		"build_mb": (rss_built - rss_before) / 1024,
+		"peak_mb": peak_mb,
+		"solve": solve_time,
+		"nodes": nodes if nodes is not None else -1,
+		"optimal": status == OptimizationStatus.OPTIMAL,
+		"objective": model.objective_value if model.num_solutions else float('inf'),
+		"bound": bound if bound is not None else float('nan'),
+		"root_bound": root_bound,
+	})
+
+def benchmark(input_files, names, timeout):
+	"""
+	Run every formulation on every input and print one row per run. The root gap of each
+	formulation is measured against the best objective any formulation found for that input.
+	Input:
+		input_files: list of paths to .in files
+		names: list of keys into FORMULATIONS
+		timeout: seconds given to each MIP
+	"""
+	header = "{:<12} {:<13} {:>9} {:>9} {:>10} {:>8} {:>9} {:>9} {:>8} {:>8} {:>8} {:>14} {:>14} {:>9}"
+	row = "{input:<12} {formulation:<13} {cols:>9} {rows:>9} {nz:>10} {build:>8.2f} {build_mb:>9.1f} {peak_mb:>9.1f} {solve:>8.2f} {nodes:>8} {optimal!s:>8} {objective:>14.4f} {bound:>14.4f} {root_gap:>8.2%}"
+	print(header.format("input", "model", "cols", "rows", "nonzeros", "build s", "build MB", "peak MB", "solve s", "nodes", "optimal", "objective", "bound", "root gap"))
+
+	# spawn rather than fork, so every run starts from a fresh interpreter and solver library
+	context = multiprocessing.get_context("spawn")
+	results = context.Queue()
+	for input_file in input_files:
+		runs = []
+		for name in names:
+			process = context.Process(target=run_formulation, args=(input_file, name, timeout, results))
+			process.start()
+			stats = None
+			while stats is None and process.is_alive():
+				try:
+					stats = results.get(timeout=1)
+				except queue.Empty:
+					pass
+			process.join()
+			if stats is None and not results.empty():
+				stats = results.get()
+
+			if stats is None:
+				print("{:<12} {:<13} failed with exit code {}".format(input_file.split('/')[-1], name, process.exitcode))
+			else:
+				runs.append(stats)
+
+		if not runs:
+			continue
+		best = min(stats["objective"] for stats in runs)
+		for stats in runs:
+			stats["root_gap"] = (best - stats["root_bound"]) / best if 0 < best < float('inf') else float('nan')
+			print(row.format(**stats))
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Benchmark ILP formulations')
+	parser.add_argument('inputs', type=str, nargs='*', default=DEFAULT_INPUTS, help='The input files to benchmark')
+	parser.add_argument('-f', dest='formulations', nargs='+', choices=list(FORMULATIONS), default=list(FORMULATIONS), help='The formulations to compare')
+	parser.add_argument('-t', dest='timeout', type=int, default=60, help='Timeout in seconds for each MIP')
+	parser.add_argument('--hard', dest='hard', type=int, default=0, help='Benchmark this many of the worst scoring inputs in score.py instead')
+	args = parser.parse_args()
+	benchmark(hard_inputs(args.hard) if args.hard else args.inputs, args.formulations, args.timeout)
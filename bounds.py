@@ -0,0 +1,191 @@
+# lower bounds on the optimal cost of each input, cheap enough to compute for every input, stored next to the best known costs
+
+import argparse
+import multiprocessing
+import time
+import numpy as np
+import utils
+from scipy.sparse.csgraph import minimum_spanning_tree
+from input_cache import read_input
+from results_store import get_store
+from distance_oracle import get_oracle
+from incidence import get_incidence
+from lemma_cuts import add_closest_dropoff_cuts
+from cuts import ConnectivityCutGenerator
+from run_log import capture_output
+from student_utils import adjacency_matrix_to_graph
+from solver_toolbox import ILPSolver, OptimizationStatus
+
+# Rounds of connectivity cuts added to the LP relaxation, stopping early once a round raises the bound by less than CUT_TOLERANCE
+CUT_ROUNDS = 10
+CUT_TOLERANCE = 1e-3
+
+# bound name -> function(G, home_indices, starting_car_index) returning a lower bound
+BOUNDS = {}
+
+def bound(name):
+	""" Register a bound function under the given name """
+	def register(function):
+		BOUNDS[name] = function
+		return function
+	return register
+
+@bound("radius")
+def radius_bound(G, home_indices, starting_car_index):
+	"""
+	Assignment-based bound. If the car goes no further than R from the start, it drives at least 2R,
+	and a TA living d from the start gets off at most R from the start and walks at least d - R.
+	The cost is therefore at least min over R of 4/3 R + Sum{max(0, d_k - R)}, reached at R = 0 or some d_k.
+	Input:
+		G: A NetworkX graph
+		home_indices: The indices of the vertices in G that are TA homes
+		starting_car_index: The index of the car's starting vertex
+	Output:
+		Lower bound on the optimal cost
+	"""
+	d = get_oracle(G).dist[starting_car_index, home_indices]
+	radii = np.concatenate(([0.0], d))
+	costs = 4.0 / 3.0 * radii + np.maximum(0.0, d[np.newaxis, :] - radii[:, np.newaxis]).sum(axis=1)
+	return float(costs.min())
+
+@bound("steiner")
+def steiner_bound(G, home_indices, starting_car_index):
+	"""
+	Steiner-tree-based bound. The car's edges and the TAs' walks together connect the start to every home,
+	so they weigh at least the Steiner tree of those vertices, and the cost is at least 2/3 of that.
+	The Steiner tree is bounded below by the MST of the metric closure divided by 2(1 - 1/t) for t terminals.
+	Input:
+		G: A NetworkX graph
+		home_indices: The indices of the vertices in G that are TA homes
+		starting_car_index: The index of the car's starting vertex
+	Output:
+		Lower bound on the optimal cost
+	"""
+	terminals = sorted(set(home_indices) | {starting_car_index})
+	if len(terminals) < 2:
+		return 0.0
+	closure = get_oracle(G).dist[np.ix_(terminals, terminals)]
+	mst = minimum_spanning_tree(closure).sum()
+	return float(2.0 / 3.0 * mst / (2 * (1 - 1 / len(terminals))))
+
+@bound("lp")
+def lp_bound(G, home_indices, starting_car_index):
+	"""
+	LP relaxation of the assignment formulation, tightened by the closest-dropoff lemma and a few rounds
+	of car tour connectivity cuts. The car flow is left out, its big-M constraints add little to the LP.
+	Input:
+		G: A NetworkX graph
+		home_indices: The indices of the vertices in G that are TA homes
+		starting_car_index: The index of the car's starting vertex
+	Output:
+		Lower bound on the optimal cost, or None if the LP wasn't solved
+	"""
+	inc = get_incidence(G)
+	model, variables = ILPSolver(formulation="assign").build_model(G, home_indices, starting_car_index, lazy_cuts=True)
+	model.cuts_generator = model.lazy_constrs_generator = None
+	add_closest_dropoff_cuts(model, variables["x"], variables["a"], inc, get_oracle(G).dist, home_indices, starting_car_index)
+	separator = ConnectivityCutGenerator(variables["x"], inc, starting_car_index, lazy=True)
+
+	model.verbose = 0
+	lower_bound = None
+	for i in range(CUT_ROUNDS):
+		# the LP solver prints its progress whatever the verbosity
+		with capture_output():
+			status = model.optimize(relax=True)
+		if status != OptimizationStatus.OPTIMAL:
+			break
+		previous, lower_bound = lower_bound, float(model.objective_value)
+		if previous is not None and lower_bound - previous < CUT_TOLERANCE * abs(lower_bound):
+			break
+
+		num_cuts = separator.num_cuts
+		separator.generate_constrs(model)
+		if separator.num_cuts == num_cuts:
+			break
+	return lower_bound
+
+def compute_bounds(input_file, names):
+	"""
+	Input:
+		input_file: path to the .in file
+		names: keys into BOUNDS
+	Output:
+		Dictionary mapping bound name to (lower bound or None, seconds taken)
+	"""
+	num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = read_input(input_file)
+	G, message = adjacency_matrix_to_graph(adjacency_matrix)
+	home_indices = list_locations.indices(list_houses)
+	starting_car_index = list_locations.index(starting_car_location)
+
+	results = {}
+	for name in names:
+		start = time.time()
+		results[name] = (BOUNDS[name](G, home_indices, starting_car_index), time.time() - start)
+	return results
+
+def bound_worker(task):
+	input_file, names = task
+	return input_file, compute_bounds(input_file, names)
+
+def bound_all(input_files, names, jobs=1):
+	"""
+	Compute the bounds of every input and store them, printing each input's best bound and remaining gap.
+	Input:
+		input_files: list of paths to .in files
+		names: keys into BOUNDS
+		jobs: number of worker processes
+	"""
+	tasks = [(input_file, names) for input_file in input_files]
+	if jobs > 1:
+		pool = multiprocessing.Pool(jobs)
+		results = pool.imap_unordered(bound_worker, tasks)
+	else:
+		pool = None
+		results = map(bound_worker, tasks)
+
+	store = get_store()
+	row = "{:<12} {:>14} {:>14} {:>8}  {}"
+	print(row.format("input", "objective", "bound", "gap", "bounds"))
+	try:
+		for input_file, bounds in results:
+			input_file_name = input_file.split('/')[-1]
+			with store.transaction():
+				for name, (value, seconds) in bounds.items():
+					if value is not None:
+						store.record_bound(input_file_name, name, value)
+			objective, best = store.best_objective(input_file_name), store.bound(input_file_name)
+			gap = store.gap(input_file_name)
+			print(row.format(input_file_name, "-" if objective is None else "{:.4f}".format(objective), "{:.4f}".format(best),
+				"-" if gap is None else "{:.2%}".format(gap),
+				", ".join("{}={} ({:.2f}s)".format(name, "-" if value is None else "{:.4f}".format(value), seconds) for name, (value, seconds) in bounds.items())))
+	finally:
+		if pool is not None:
+			pool.close()
+			pool.join()
+
+def report(count):
+	""" Print the stored inputs with the largest gaps between best known cost and best bound """
+	rows = get_store().gaps()
+	unbounded = [row for row in rows if row[4] is None]
+	bounded = sorted((row for row in rows if row[4] is not None), key=lambda row: row[4], reverse=True)
+	print("{} inputs, {} proven optimal, {} without a bound".format(len(rows), sum(1 for row in rows if row[2]), len(unbounded)))
+	if bounded:
+		print("Mean gap {:.3%}, largest:".format(sum(row[4] for row in bounded) / len(bounded)))
+		for input_file, objective, optimal, lower_bound, gap in bounded[:count]:
+			print("  {:<12} {:>14.4f} {:>14} {:>8.2%}".format(input_file, objective, "-" if lower_bound is None else "{:.4f}".format(lower_bound), gap))
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Compute and store lower bounds for inputs')
+	parser.add_argument('inputs', type=str, nargs='*', help='The input files, or directories of input files')
+	parser.add_argument('-b', dest='bounds', nargs='+', choices=list(BOUNDS), default=list(BOUNDS), help='The bounds to compute')
+	parser.add_argument('--jobs', dest='jobs', type=int, default=1, help='Number of inputs to bound at once')
+	parser.add_argument('--report', dest='report', type=int, nargs='?', const=20, default=0, help='Print the inputs with the largest stored gaps')
+	args = parser.parse_args()
+
+	input_files = []
+	for path in args.inputs:
+		input_files += utils.get_files_with_extension(path, 'in') if not path.endswith('.in') else [path]
+	if input_files:
+		bound_all(input_files, args.bounds, args.jobs)
+	if args.report:
+		report(args.report)
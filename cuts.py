@@ -0,0 +1,121 @@
+# constraint generators that python-mip calls back into while solving
+
+import networkx as nx
+from mip import xsum
+from mip.callbacks import ConstrsGenerator, CutPool
+
+# x values at or below this are treated as zero when separating cuts
+EPS = 1e-4
+
+class ConnectivityCutGenerator(ConstrsGenerator):
+	"""
+	Separates car tour connectivity cuts: for every vertex set S not containing the start and
+	every car edge e inside S, the car must drive into S at least as much as it drives along e.
+	Used both as a cut generator on fractional solutions and as a separator adding constraints to the model
+	between solves; CBC's lazy constraints drop valid solutions, so it is never one.
+	"""
+
+	def __init__(self, x, inc, starting_car_index, lazy=False):
+		"""
+		Input:
+			x: Car edge variables, one per directed edge of inc
+			inc: EdgeIncidence of the graph
+			starting_car_index: The index of the car's starting vertex
+			lazy: If true, every violated constraint is added, including ones added before
+		"""
+		self.x = x
+		self.inc = inc
+		self.start = starting_car_index
+		self.lazy = lazy
+		self.num_cuts = 0
+
+		# optional cuts already handed to the solver, so the same set is not separated over and over
+		self.pool = CutPool()
+
+		# the callback model is rebuilt on every call, but has the same columns for the whole solve
+		self.translated = {}
+
+	def model_vars(self, model):
+		""" Map the car edge variables into the (possibly preprocessed) model passed to the callback """
+		key = model.num_cols
+		if key not in self.translated:
+			if hasattr(model, "translate"):
+				self.translated[key] = model.translate(self.x)
+			else:
+				self.translated[key] = [model.var_by_name(var.name) for var in self.x]
+		return self.translated[key]
+
+	def generate_constrs(self, model, depth=0, npass=0):
+		xs = self.model_vars(model)
+		values = [var.x if var is not None else 0.0 for var in xs]
+
+		support = nx.DiGraph()
+		support.add_node(self.start)
+		for i, (u, v, w) in enumerate(self.inc.E):
+			if values[i] > EPS:
+				support.add_edge(u, v, capacity=values[i])
+
+		reachable = nx.descendants(support, self.start) | {self.start}
+
+		# parts of the tour that the car can never reach from the start
+		unreachable = support.subgraph(set(support.nodes) - reachable)
+		for component in nx.weakly_connected_components(unreachable):
+			self.add_cut(model, xs, values, set(component))
+
+		# an integral tour is connected exactly when every part of it is reachable
+		if all(value <= EPS or value >= 1 - EPS for value in values):
+			return
+
+		# reachable vertices that get less flow from the start than their own edges carry
+		covered = set()
+		for v in reachable:
+			if v == self.start or v in covered:
+				continue
+			cut_value, (source_side, sink_side) = nx.minimum_cut(support, self.start, v)
+			if self.add_cut(model, xs, values, set(sink_side), cut_value):
+				covered |= set(sink_side)
+
+	def add_tour_constrs(self, model):
+		"""
+		Add x(edges entering S) >= x_e for every part S of the model's integral tour that the car can't reach
+		from the start, and every edge e the tour drives inside S.
+		Output:
+			Number of constraints added
+		"""
+		xs = self.model_vars(model)
+		values = [var.x for var in xs]
+		used = nx.DiGraph([self.inc.E[i][:2] for i in range(len(xs)) if values[i] > 0.5])
+		used.add_node(self.start)
+
+		num_cuts = self.num_cuts
+		reachable = nx.descendants(used, self.start) | {self.start}
+		for S in nx.weakly_connected_components(used.subgraph(set(used.nodes) - reachable)):
+			entering = [i for v in S for i in self.inc.in_edges[v] if self.inc.E[i][0] not in S]
+			for i in [i for v in S for i in self.inc.in_edges[v] if self.inc.E[i][0] in S and values[i] > 0.5]:
+				model += xsum(xs[j] for j in entering) >= xs[i]
+				self.num_cuts += 1
+		return self.num_cuts - num_cuts
+
+	def add_cut(self, model, xs, values, S, cut_value=0.0):
+		"""
+		Add x(edges entering S) >= x_e for the heaviest edge e inside S, if it is violated.
+		Output:
+			Whether a cut was added
+		"""
+		inside = [i for v in S for i in self.inc.in_edges[v] if self.inc.E[i][0] in S and xs[i] is not None]
+		if not inside:
+			return False
+		heaviest = max(inside, key=lambda i: values[i])
+		if values[heaviest] <= cut_value + EPS:
+			return False
+
+		# an edge removed by preprocessing may be fixed to one, so leave such sets alone
+		entering = [i for v in S for i in self.inc.in_edges[v] if self.inc.E[i][0] not in S]
+		if any(xs[i] is None for i in entering):
+			return False
+		cut = xsum(xs[i] for i in entering) >= xs[heaviest]
+		if not self.lazy and not self.pool.add(cut):
+			return False
+		model += cut
+		self.num_cuts += 1
+		return True
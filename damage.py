@@ -1,53 +1,135 @@
+# the damages table of each submitted output's cost as a percentage of its input's naive cost, updated only for outputs that changed
+
+import os
 import sqlite3
-from output_validator import *
+import argparse
+import output_validator
 from utils import *
 from progressbar import ProgressBar
+from evaluator import get_evaluator
+from input_cache import read_input, file_digest
+from results_store import get_store
+from student_utils import adjacency_matrix_to_graph
+
+DAMAGES_PATH = 'damages.sqlite'
+
+INPUT_DIRECTORY = 'batches/inputs'
+OUTPUT_DIRECTORY = 'submissions/submission_final'
 
-conn = sqlite3.connect('models.sqlite')
-c = conn.cursor()
+# input_file is the input's name without .in, digest the SHA-1 of the output the damage was computed from.
+# damage and cost are NULL for an invalid output.
+CREATE_DAMAGES = 'CREATE TABLE IF NOT EXISTS damages (input_file TEXT PRIMARY KEY, damage NUMERIC, cost REAL, digest TEXT)'
 
-results = c.execute("SELECT * FROM models ORDER BY input_file").fetchall()
+# columns added since the table was first created, added to older copies of it
+ADDED_COLUMNS = {"cost": "REAL", "digest": "TEXT"}
 
-conn.commit()
-conn.close()
+# Number of the most damaging inputs listed by default
+REPORT_COUNT = 20
 
-pbar = ProgressBar()
+SET_DAMAGE = 'INSERT OR REPLACE INTO damages (input_file, damage, cost, digest) VALUES (?, ?, ?, ?)'
 
-conn = sqlite3.connect('damages.sqlite')
-c = conn.cursor()
-c.execute("DROP TABLE IF EXISTS damages")
-c.execute("CREATE TABLE damages (input_file TEXT PRIMARY KEY, damage NUMERIC)")
+SELECT_DIGESTS = 'SELECT input_file, digest FROM damages'
 
-files = []
-for file, score, optimal in pbar(results):
-	file = file.split('.')[0]
-	our_cost = validate_output_nm('batches/inputs/{}.in'.format(file), 'submissions/submission_final/{}.out'.format(file))
+SELECT_DAMAGES = 'SELECT input_file, damage FROM damages ORDER BY damage DESC'
 
-	input_data = read_file('batches/inputs/{}.in'.format(file))
-	number_of_locations, number_of_houses, list_of_locations, list_of_houses, starting_location, adjacency_matrix = data_parser(input_data)
+def connect(path=DAMAGES_PATH):
+	""" Open the damages table, creating it or adding the columns it lacks """
+	conn = sqlite3.connect(path)
+	conn.execute(CREATE_DAMAGES)
+	columns = set(row[1] for row in conn.execute('PRAGMA table_info(damages)'))
+	for column, column_type in ADDED_COLUMNS.items():
+		if column not in columns:
+			conn.execute('ALTER TABLE damages ADD COLUMN {} {}'.format(column, column_type))
+	return conn
 
-	path = convert_locations_to_indices([starting_location], list_of_locations)
-	homes = convert_locations_to_indices(list_of_houses, list_of_locations)
-	dropoffs = {path[0]: homes}
+def naive_cost(parsed_input):
+	"""
+	Input:
+		parsed_input: The input's data_parser tuple
+	Output:
+		Cost of every TA walking home from the start
+	"""
+	number_of_locations, number_of_houses, list_of_locations, list_of_houses, starting_location, adjacency_matrix = parsed_input
+	path = [list_of_locations.index(starting_location)]
 	G, message = adjacency_matrix_to_graph(adjacency_matrix)
-	bad_cost, message = cost_of_solution(G, path, dropoffs)
+	cost, message = get_evaluator(G).cost_of_solution(path, {path[0]: list_of_locations.indices(list_of_houses)})
+	return cost
+
+def update_damages(input_directory=INPUT_DIRECTORY, output_directory=OUTPUT_DIRECTORY, force=False):
+	"""
+	Recompute the damage of every input in models.sqlite whose output has changed since its damage was stored.
+	Naive costs are computed once per input and kept in the results store's baselines table.
+	Input:
+		input_directory: The directory of .in files
+		output_directory: The directory of .out files
+		force: If true, recompute every damage
+	Output:
+		Number of damages recomputed, and number of outputs missing
+	"""
+	store = get_store()
+	baselines = store.baselines()
+	conn = connect()
+	digests = dict(conn.execute(SELECT_DIGESTS).fetchall())
+
+	updated, missing = 0, 0
+	pbar = ProgressBar()
+	for input_file_name, objective, optimal in pbar(store.all()):
+		name = input_file_name.split('.')[0]
+		input_file = os.path.join(input_directory, name + '.in')
+		output_file = os.path.join(output_directory, name + '.out')
+		if not os.path.exists(output_file):
+			missing += 1
+			continue
+
+		digest = file_digest(output_file)
+		if not force and digests.get(name) == digest and input_file_name in baselines:
+			continue
 
-	damage = our_cost / bad_cost * 100.0
+		parsed_input = read_input(input_file)
+		if input_file_name not in baselines:
+			baselines[input_file_name] = naive_cost(parsed_input)
+			store.set_baseline(input_file_name, baselines[input_file_name])
 
-	c.execute('INSERT INTO damages (input_file, damage) VALUES (?, ?)', (file, damage))
+		cost, message = output_validator.tests(None, read_file(output_file), parsed_input=parsed_input)
+		if cost == 'infinite':
+			conn.execute(SET_DAMAGE, (name, None, None, digest))
+		else:
+			conn.execute(SET_DAMAGE, (name, cost / baselines[input_file_name] * 100.0, cost, digest))
+		updated += 1
 
+	conn.commit()
+	conn.close()
+	return updated, missing
 
-	files.append((damage, file, optimal))
+def report(count):
+	""" Print the mean damage and the non-optimal inputs with the most damage, from the stored tables only """
+	conn = connect()
+	rows = conn.execute(SELECT_DAMAGES).fetchall()
+	conn.close()
+	optimal = set(input_file.split('.')[0] for input_file, objective, is_optimal in get_store().all() if is_optimal)
 
-files.sort(key = lambda x: x[0])
-conn.commit()
-conn.close()
+	valid = [(name, damage) for name, damage in rows if damage is not None]
+	invalid = [name for name, damage in rows if damage is None]
+	if not valid:
+		print("No damages stored, run damage.py first")
+		return
+	print("{} outputs, mean damage {:.4f}, {} proven optimal, {} invalid".format(len(rows), sum(damage for name, damage in valid) / len(valid),
+		sum(1 for name, damage in valid if name in optimal), len(invalid)))
+	for name in invalid:
+		print("  invalid: {}".format(name))
+	print("Most damaging inputs not proven optimal:")
+	for name, damage in [row for row in valid if row[0] not in optimal][:count]:
+		print("  {:<10} {:.4f}".format(name, damage))
 
-print("\n\nDamaging Files")
-total = 0
-for f in files:
-	total += f[0]
-	if f[2] == 0:
-		print(f)
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Update the damage of every changed output, or report the stored damages')
+	parser.add_argument('--inputs', dest='input_directory', type=str, default=INPUT_DIRECTORY, help='The directory of input files')
+	parser.add_argument('--outputs', dest='output_directory', type=str, default=OUTPUT_DIRECTORY, help='The directory of output files')
+	parser.add_argument('--force', action='store_true', help='Recompute every damage, not only those of changed outputs')
+	parser.add_argument('--report', dest='report', type=int, nargs='?', const=REPORT_COUNT, default=None, help='Only print the stored mean damage and this many of the most damaging inputs')
+	args = parser.parse_args()
 
-print(total / len(files))
+	if args.report is None:
+		updated, missing = update_damages(args.input_directory, args.output_directory, args.force)
+		print("\n{} damages updated, {} outputs missing".format(updated, missing))
+	report(args.report if args.report is not None else REPORT_COUNT)
@@ -0,0 +1,60 @@
+# shared all-pairs shortest path data, computed once per graph and reused by every solver and cost check
+
+import weakref
+import numpy as np
+from scipy.sparse.csgraph import shortest_path
+
+class DistanceOracle:
+	""" Dense all-pairs distance and predecessor matrices for a graph whose nodes are 0..n-1 """
+
+	def __init__(self, G):
+		"""
+		Input:
+			G: A NetworkX graph with integer nodes 0..n-1 and 'weight' edge attributes
+		"""
+		n = G.number_of_nodes()
+
+		# weights[u][v] is the weight of edge (u, v), or inf if there is no such edge
+		self.weights = np.full((n, n), np.inf)
+		for u, v, w in G.edges(data='weight'):
+			self.weights[u, v] = w
+			if not G.is_directed():
+				self.weights[v, u] = w
+
+		# dist[u][v] is the shortest distance from u to v, pred[u][v] is the vertex before v on that path
+		self.dist, self.pred = shortest_path(self.weights, directed=G.is_directed(), return_predecessors=True)
+
+	def path(self, source, target):
+		"""
+		Reconstruct a shortest path from the predecessor matrix.
+		Input:
+			source: starting vertex
+			target: ending vertex
+		Output:
+			List of vertices from source to target, inclusive
+		"""
+		path = [target]
+		curr = target
+		while curr != source:
+			curr = self.pred[source, curr]
+			if curr < 0:
+				return []
+			path.append(curr)
+		return [int(v) for v in path[::-1]]
+
+# Oracles are keyed by graph identity, so graphs must not be mutated after their first lookup
+_oracles = weakref.WeakKeyDictionary()
+
+def get_oracle(G):
+	"""
+	Fetch the distance oracle for G, computing it on first use.
+	Input:
+		G: A NetworkX graph with integer nodes 0..n-1
+	Output:
+		DistanceOracle shared by every caller holding the same graph object
+	"""
+	oracle = _oracles.get(G)
+	if oracle is None:
+		oracle = DistanceOracle(G)
+		_oracles[G] = oracle
+	return oracle
@@ -0,0 +1,113 @@
+# solution costs computed with array indexing into the weight and distance matrices
+
+import numpy as np
+from distance_oracle import get_oracle
+
+class CostEvaluator:
+	""" Scores car cycles and dropoff mappings against dense weight and distance matrices """
+
+	def __init__(self, weights, dist):
+		"""
+		Input:
+			weights: weights[u][v] is the weight of edge (u, v), or inf if there is no such edge
+			dist: dist[u][v] is the shortest distance from u to v
+		"""
+		self.weights = np.asarray(weights, dtype=float)
+		self.dist = np.asarray(dist, dtype=float)
+
+	def is_valid_walk(self, car_cycle):
+		""" Whether every step of the car cycle is along an edge, like student_utils.is_valid_walk """
+		if len(car_cycle) == 2:
+			return car_cycle[0] == car_cycle[1]
+		if any(v is None for v in car_cycle):
+			return False
+		steps = np.asarray(car_cycle, dtype=int)
+		return bool(np.isfinite(self.weights[steps[:-1], steps[1:]]).all())
+
+	def driving_cost(self, car_cycle):
+		""" Cost of driving the car cycle, which must be a valid closed walk """
+		if len(car_cycle) == 2:
+			return 0
+		steps = np.asarray(car_cycle, dtype=int)
+		return sum(self.weights[steps[:-1], steps[1:]].tolist()) * 2 / 3
+
+	def walking_cost(self, dropoff_mapping):
+		""" Cost of every TA walking home from their dropoff """
+		dropoffs = [d for d in dropoff_mapping for h in dropoff_mapping[d]]
+		homes = [h for d in dropoff_mapping for h in dropoff_mapping[d]]
+		return sum(self.dist[dropoffs, homes].tolist())
+
+	def cost_of_solution(self, car_cycle, dropoff_mapping):
+		"""
+		Same result and message as student_utils.cost_of_solution, without going through NetworkX.
+		Input:
+			car_cycle: The car's closed walk, in terms of indices
+			dropoff_mapping: A dictionary mapping drop-off location to a list of homes of TAs that got off there
+		Output:
+			The total cost, or 'infinite' if the solution is invalid
+			A message describing the cost
+		"""
+		cost = 0
+		message = ''
+		if not self.is_valid_walk(car_cycle):
+			message += 'This is not a valid walk for the given graph.\n'
+			cost = 'infinite'
+
+		if not car_cycle[0] == car_cycle[-1]:
+			message += 'The start and end vertices are not the same.\n'
+			cost = 'infinite'
+		if cost != 'infinite':
+			driving_cost = self.driving_cost(car_cycle)
+			walking_cost = self.walking_cost(dropoff_mapping)
+
+			message += f'The driving cost of your solution is {driving_cost}.\n'
+			message += f'The walking cost of your solution is {walking_cost}.\n'
+			cost = driving_cost + walking_cost
+
+		message += f'The total cost of your solution is {cost}.\n'
+		return cost, message
+
+	def score_batch(self, car_cycles, home_indices):
+		"""
+		Score many candidate car cycles at once, with every TA getting off at the closest vertex of the cycle.
+		Input:
+			car_cycles: List of closed walks, in terms of indices
+			home_indices: The indices of the vertices that are TA homes
+		Output:
+			Array of total costs, inf for cycles that are not valid closed walks
+		"""
+		num_cycles = len(car_cycles)
+		lengths = np.array([len(cycle) for cycle in car_cycles], dtype=int)
+		steps = np.concatenate([np.asarray(cycle, dtype=int) for cycle in car_cycles])
+
+		# each step's cycle, and whether the step is followed by another step of the same cycle
+		owners = np.repeat(np.arange(num_cycles), lengths)
+		moves = np.ones(len(steps), dtype=bool)
+		moves[np.cumsum(lengths) - 1] = False
+
+		step_weights = self.weights[steps[:-1], steps[1:]][moves[:-1]]
+		driving = np.bincount(owners[:-1][moves[:-1]], weights=step_weights, minlength=num_cycles) * 2 / 3
+
+		# a cycle may stay at its start, and otherwise must follow edges back to where it began
+		starts, ends = steps[np.cumsum(lengths) - lengths], steps[np.cumsum(lengths) - 1]
+		stationary = (lengths <= 1) | ((lengths == 2) & (starts == ends))
+		driving[stationary] = 0
+		driving[starts != ends] = np.inf
+
+		# visited[i][v] is whether cycle i passes through v
+		visited = np.zeros((num_cycles, len(self.dist)), dtype=bool)
+		visited[owners, steps] = True
+		to_homes = self.dist[:, home_indices]
+		walking = np.array([to_homes[row].min(axis=0).sum() for row in visited])
+
+		return driving + walking
+
+def get_evaluator(G):
+	"""
+	Input:
+		G: A NetworkX graph with integer nodes 0..n-1
+	Output:
+		CostEvaluator over the graph's cached weight and distance matrices
+	"""
+	oracle = get_oracle(G)
+	return CostEvaluator(oracle.weights, oracle.dist)
@@ -2,7 +2,6 @@ import os
 import math
 import utils
 import pickle
-import sqlite3
 import argparse
 import networkx
 import numpy as np
@@ -13,6 +12,8 @@ import matplotlib.pylab as plb
 from solver import *
 from student_utils import *
 from solver_toolbox import *
+from input_cache import read_input
+from results_store import get_store
 from matplotlib.widgets import Button
 from scipy.sparse.csgraph import connected_components
 
@@ -220,10 +221,9 @@ class GraphVisualizer:
 
 	def visFromAdj(self, input_matrix, solution_file=None, draw=False, G=None):
 		if (not G):
-			input_data = utils.read_file(input_matrix)
-			num_of_locations, num_houses, list_of_locations, list_of_homes, starting_car_location, adjacency_matrix = data_parser(input_data)
-			home_indices = convert_locations_to_indices(list_of_homes, list_of_locations)
-			location_indices = convert_locations_to_indices(list_of_locations, list_of_locations)
+			num_of_locations, num_houses, list_of_locations, list_of_homes, starting_car_location, adjacency_matrix = read_input(input_matrix)
+			home_indices = list_of_locations.indices(list_of_homes)
+			location_indices = list_of_locations.indices(list_of_locations)
 
 			self.adj_mat = adjacency_matrix
 			self.homes = home_indices
@@ -313,27 +313,21 @@ class GraphVisualizer:
 		self.path.pop()
 		convertToFile(self.path, self.dropoffs, self.out_file, self.locations)
 
-		conn = sqlite3.connect('models.sqlite')
-		c = conn.cursor()
-		c.execute('UPDATE models SET best_objective_bound = ?, optimal = ? WHERE input_file = ?', \
-				(self.new_cost, 0, self.in_file))
-		conn.commit()
-		conn.close()
+		get_store().set(self.in_file, self.new_cost, False)
 
 		print("Successfuly wrote new path to output file:", self.out_file)
 
 	def visIter(self, input_directory="batches/inputs/", output_directory="submissions/submission_final/"):
-		conn = sqlite3.connect('models.sqlite')
-		c = conn.cursor()
+		store = get_store()
 
 		for entry in os.scandir(input_directory): 
 			input_file = entry.path.split('/')[-1]
-			query_result = c.execute('SELECT optimal, best_objective_bound FROM models WHERE input_file = (?)', (input_file,)).fetchone()
+			query_result = store.get(input_file)
 
-			if (query_result and not query_result[0]):
+			if (query_result and not query_result[1]):
 				print(entry.path)
 
-				self.curr_cost = query_result[1]
+				self.curr_cost = query_result[0]
 				self.in_file = input_file
 				self.out_file = "submissions/submission_boosted/" + input_file.split('.')[0] + ".out"
 
@@ -361,8 +355,6 @@ class GraphVisualizer:
 				print("No suboptimal files found in the given input directory.\nEither all files in the directory are optimal,",
 					"the directory is empty, or any suboptimal files in the directory is not in the MODELS table.")
 
-		conn.close()
-
 # -------------------------------------------------------------- COMMAND LINE INTERFACE -------------------------------------------------------------- #
 if __name__=="__main__":
 	parser = argparse.ArgumentParser(description='Parsing arguments')
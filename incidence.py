@@ -0,0 +1,50 @@
+# directed edge indexing shared by the ILP model builders
+
+import weakref
+import numpy as np
+
+class EdgeIncidence:
+	""" Directed edge list of a graph with per-vertex in-edge and out-edge index lists """
+
+	def __init__(self, G):
+		"""
+		Input:
+			G: A NetworkX graph with integer nodes 0..n-1 and 'weight' edge attributes
+		"""
+		self.n = G.number_of_nodes()
+
+		# E[i] = (u, v, weight) for the ith directed edge, in the order the models create variables
+		self.E = list(G.to_directed().edges(data='weight'))
+		self.tails = np.array([e[0] for e in self.E], dtype=int)
+		self.heads = np.array([e[1] for e in self.E], dtype=int)
+		self.weights = np.array([e[2] for e in self.E], dtype=float)
+
+		# edge_id[(u, v)] is the index of directed edge (u, v) in E
+		self.edge_id = {(e[0], e[1]): i for i, e in enumerate(self.E)}
+
+		# in_edges[v] / out_edges[v] are the indices of the edges entering / leaving v
+		self.in_edges = [[] for _ in range(self.n)]
+		self.out_edges = [[] for _ in range(self.n)]
+		for i, (u, v, w) in enumerate(self.E):
+			self.out_edges[u].append(i)
+			self.in_edges[v].append(i)
+
+	def __len__(self):
+		return len(self.E)
+
+# Incidences are keyed by graph identity, so graphs must not be mutated after their first lookup
+_incidences = weakref.WeakKeyDictionary()
+
+def get_incidence(G):
+	"""
+	Fetch the edge incidence for G, computing it on first use.
+	Input:
+		G: A NetworkX graph with integer nodes 0..n-1
+	Output:
+		EdgeIncidence shared by every caller holding the same graph object
+	"""
+	incidence = _incidences.get(G)
+	if incidence is None:
+		incidence = EdgeIncidence(G)
+		_incidences[G] = incidence
+	return incidence
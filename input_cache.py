@@ -0,0 +1,164 @@
+# compiled .npz copies of the .in files, so inputs are parsed from text only once
+
+import os
+import hashlib
+import tempfile
+import numpy as np
+import utils
+from student_utils import data_parser
+from location_index import LocationIndex
+
+# Compiled inputs live here, one .npz per source file
+CACHE_DIRECTORY = 'serialized_graphs/inputs'
+
+class CompiledMatrix(list):
+	""" An adjacency matrix in data_parser's list form that also carries its float array, for adjacency_matrix_to_graph """
+
+	def __init__(self, rows, weights):
+		super().__init__(rows)
+		self.weights = weights
+
+class CompiledInput:
+	""" The parsed contents of one .in file, with the adjacency matrix as a dense float array """
+
+	def __init__(self, number_of_locations, number_of_houses, list_of_locations, list_of_houses, starting_location, weights):
+		"""
+		Input:
+			number_of_locations, number_of_houses: The counts stated on the first two lines of the file
+			list_of_locations: A list of locations such that node i of the graph corresponds to name at index i of the list
+			list_of_houses: A list of homes
+			starting_location: The name of the starting location for the car
+			weights: weights[u][v] is the adjacency matrix entry, or inf where the file has 'x'
+		"""
+		self.number_of_locations = number_of_locations
+		self.number_of_houses = number_of_houses
+		self.list_of_locations = LocationIndex(list_of_locations)
+		self.list_of_houses = list_of_houses
+		self.starting_location = starting_location
+		self.weights = weights
+
+		self.home_indices = self.list_of_locations.indices(list_of_houses)
+		self.start_index = self.list_of_locations.get(starting_location)
+
+	def adjacency_matrix(self):
+		""" The adjacency matrix in data_parser's form, floats with 'x' for missing edges """
+		matrix = self.weights.astype(object)
+		matrix[np.isinf(self.weights)] = 'x'
+		return CompiledMatrix(matrix.tolist(), self.weights)
+
+	def parsed(self):
+		""" The same tuple data_parser returns for the source file """
+		return self.number_of_locations, self.number_of_houses, self.list_of_locations, \
+			list(self.list_of_houses), self.starting_location, self.adjacency_matrix()
+
+def file_digest(input_file):
+	""" SHA-1 of the file's bytes, used to revalidate a cache entry whose mtime has changed """
+	with open(input_file, 'rb') as f:
+		return hashlib.sha1(f.read()).hexdigest()
+
+def cache_path(input_file):
+	"""
+	Input:
+		input_file: path to the .in file
+	Output:
+		Path of its compiled copy. Files with the same name in different directories get different entries.
+	"""
+	source = os.path.realpath(input_file)
+	tag = hashlib.sha1(source.encode()).hexdigest()[:10]
+	return os.path.join(CACHE_DIRECTORY, '{}-{}.npz'.format(os.path.basename(input_file), tag))
+
+def compile_input(input_file):
+	"""
+	Parse the text file with data_parser.
+	Input:
+		input_file: path to the .in file
+	Output:
+		The data_parser tuple
+		CompiledInput, or None if the adjacency matrix isn't a rectangular array of numbers and 'x'
+	"""
+	parsed = data_parser(utils.read_file(input_file))
+	number_of_locations, number_of_houses, list_of_locations, list_of_houses, starting_location, adjacency_matrix = parsed
+	if len(set(map(len, adjacency_matrix))) != 1:
+		return parsed, None
+	weights = np.array([[np.inf if entry == 'x' else entry for entry in row] for row in adjacency_matrix], dtype=float)
+	return parsed, CompiledInput(number_of_locations, number_of_houses, list_of_locations, list_of_houses, starting_location, weights)
+
+def save_compiled(path, compiled, stat, digest):
+	""" Write the compiled input atomically, so concurrent solver processes never read a partial file """
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+	try:
+		with os.fdopen(fd, 'wb') as f:
+			np.savez(f, counts=np.array([compiled.number_of_locations, compiled.number_of_houses]),
+				locations=np.array(compiled.list_of_locations, dtype=str), houses=np.array(compiled.list_of_houses, dtype=str),
+				start=np.array(compiled.starting_location, dtype=str), weights=compiled.weights,
+				stamp=np.array([stat.st_mtime_ns, stat.st_size]), digest=np.array(digest))
+		os.replace(temp_path, path)
+	except OSError:
+		if os.path.exists(temp_path):
+			os.remove(temp_path)
+
+def read_cached(input_file):
+	"""
+	Input:
+		input_file: path to the .in file
+	Output:
+		CompiledInput from the cache, or None if there is no entry or the source has changed since it was cached
+	"""
+	path = cache_path(input_file)
+	if not os.path.exists(path):
+		return None
+	stat = os.stat(input_file)
+	try:
+		with np.load(path) as cached:
+			stamp, digest = cached['stamp'].tolist(), str(cached['digest'])
+			# a touched or re-checked-out file is still valid if its contents are unchanged
+			if stamp != [stat.st_mtime_ns, stat.st_size] and (stamp[1] != stat.st_size or digest != file_digest(input_file)):
+				return None
+			counts = cached['counts'].tolist()
+			compiled = CompiledInput(counts[0], counts[1], cached['locations'].tolist(), cached['houses'].tolist(),
+				str(cached['start']), cached['weights'])
+	except (OSError, ValueError, KeyError):
+		return None
+
+	if stamp != [stat.st_mtime_ns, stat.st_size]:
+		save_compiled(path, compiled, stat, digest)
+	return compiled
+
+def compile_and_cache(input_file):
+	""" compile_input, saving the result to the cache when the file compiles """
+	stat = os.stat(input_file)
+	parsed, compiled = compile_input(input_file)
+	if compiled is not None:
+		save_compiled(cache_path(input_file), compiled, stat, file_digest(input_file))
+	return parsed, compiled
+
+def load_compiled(input_file):
+	"""
+	Fetch the compiled input, recompiling it if the source has changed since it was cached.
+	Input:
+		input_file: path to the .in file
+	Output:
+		CompiledInput, or None if the file can't be compiled
+	"""
+	compiled = read_cached(input_file)
+	if compiled is None:
+		try:
+			parsed, compiled = compile_and_cache(input_file)
+		except (ValueError, IndexError):
+			return None
+	return compiled
+
+def read_input(input_file):
+	"""
+	Drop-in replacement for data_parser(utils.read_file(input_file)) that goes through the compiled cache.
+	Input:
+		input_file: path to the .in file
+	Output:
+		number_of_locations, number_of_houses, list_of_locations, list_of_houses, starting_location, adjacency_matrix
+	"""
+	compiled = read_cached(input_file)
+	if compiled is not None:
+		return compiled.parsed()
+	parsed, compiled = compile_and_cache(input_file)
+	return parsed
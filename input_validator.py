@@ -4,7 +4,7 @@ sys.path.append('../..')
 import os
 import argparse
 import utils
-import networkx as nx
+from input_cache import read_input
 import numpy as np
 from student_utils import *
 
@@ -13,6 +13,15 @@ RANGE_OF_INPUT_SIZES = [50, 100, 200]
 VALID_FILENAMES = ['50.in', '100.in', '200.in']
 MAX_NAME_LENGTH = 20
 
+# Edges longer than the shortest path between their ends by at least this much make the graph non-metric, as in is_metric
+METRIC_TOLERANCE = 0.00001
+
+# Version of content_tests, bump it whenever they change so results cached by validate_all are checked again
+VALIDATOR_VERSION = 2
+
+# Rows of each min-plus product computed at once, so memory stays at this many n x n arrays
+MIN_PLUS_ROWS = 16
+
 def validate_input(input_file, params=[]):
     print('Processing', input_file)
     message, error = tests(input_file, params)
@@ -26,9 +35,45 @@ def validate_all_inputs(input_directory, params=[]):
         validate_input(input_file, params=params)
 
 
-def tests(input_file, params=[]):
-    input_data = utils.read_file(input_file)
-    num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = data_parser(input_data)
+def weight_array(adjacency_matrix):
+    # float weights with inf for 'x', and nan for any entry that is neither 'x' nor a finite float
+    return np.array([[np.inf if entry == 'x' else (entry if type(entry) is float and np.isfinite(entry) else np.nan)
+        for entry in row] for row in adjacency_matrix], dtype=float)
+
+
+def shortest_distances(weights):
+    # all-pairs shortest distances by min-plus squaring, every squaring doubling the hops covered, so ceil(log2 n) of them
+    # cover every shortest path; only meaningful for non-negative weights
+    dist = np.where(np.isnan(weights), np.inf, weights)
+    np.fill_diagonal(dist, 0)
+    for _ in range(int(np.ceil(np.log2(max(len(dist), 2))))):
+        squared = np.empty_like(dist)
+        for i in range(0, len(dist), MIN_PLUS_ROWS):
+            squared[i:i + MIN_PLUS_ROWS] = (dist[i:i + MIN_PLUS_ROWS, :, np.newaxis] + dist[np.newaxis, :, :]).min(axis=1)
+        if np.array_equal(squared, dist):
+            break
+        dist = squared
+    return dist
+
+
+def edge_names(list_locations, pairs):
+    return ', '.join(f'({list_locations[u]}, {list_locations[v]})' for u, v in pairs)
+
+
+def tests(input_file, params=[], parsed_input=None):
+    if parsed_input is None:
+        parsed_input = read_input(input_file)
+    message, error = name_tests(input_file, parsed_input[0])
+    content_message, content_error = content_tests(parsed_input)
+    message += content_message
+    error = error or content_error
+
+    if not message:
+        message = "If you've received no other error messages, then your input is valid!\n\n\n"
+    return message, error
+
+
+def name_tests(input_file, num_of_locations):
     message = ''
     error = False
 
@@ -44,6 +89,15 @@ def tests(input_file, params=[]):
             message += f'Your file is named {file_basename}, but the size of the input is {num_of_locations}.\n'
             error = True
 
+    return message, error
+
+
+# everything checked here depends only on the file's contents, so bulk validation caches it by file hash
+def content_tests(parsed_input):
+    num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = parsed_input
+    message = ''
+    error = False
+
     if not all(name.isalnum() and len(name) <= MAX_NAME_LENGTH for name in list_locations):
         message += f'One or more of the names of your locations are either not alphanumeric or are above the max length of {MAX_NAME_LENGTH}.\n'
         error = True
@@ -84,41 +138,50 @@ def tests(input_file, params=[]):
         message += f'The dimensions of your adjacency matrix do not match the number of locations you provided.\n'
         error = True
 
-    if not all(entry == 'x' or (type(entry) is float and entry > 0 and entry <= 2e9 and decimal_digits_check(entry)) for row in adjacency_matrix for entry in row):
-        message += f'Your adjacency matrix may only contain the character "x", or strictly positive integers less than 2e+9, or strictly positive floats with less than 5 decimal digits.\n'
-        error = True
-
     # if not square, terminate
     if len(set(map(len, adjacency_matrix))) != 1 or len(adjacency_matrix[0]) != len(adjacency_matrix):
+        if not all(entry == 'x' or (type(entry) is float and entry > 0 and entry <= 2e9 and decimal_digits_check(entry)) for row in adjacency_matrix for entry in row):
+            message += f'Your adjacency matrix may only contain the character "x", or strictly positive integers less than 2e+9, or strictly positive floats with less than 5 decimal digits.\n'
         message += f'Your adjacency matrix must be square.\n'
         error = True
         return message, error
 
-    adjacency_matrix_numpy = np.matrix(adjacency_matrix)
-
-    # check requirements on square matrix
-    if not np.all(adjacency_matrix_numpy.T == adjacency_matrix_numpy):
-        message += f'Your adjacency matrix is not symmetric.\n'
+    # the remaining checks run on the float array, and list every entry or edge that fails them
+    weights = weight_array(adjacency_matrix)
+    finite = np.isfinite(weights)
+    with np.errstate(invalid='ignore'):
+        bad = np.isnan(weights) | (finite & ((weights <= 0) | (weights > 2e9) | (np.round(weights, 5) != weights)))
+    if bad.any():
+        message += f'Your adjacency matrix may only contain the character "x", or strictly positive integers less than 2e+9, or strictly positive floats with less than 5 decimal digits. Invalid entries: {edge_names(list_locations, np.argwhere(bad))}.\n'
         error = True
 
-    G, adj_message = adjacency_matrix_to_graph(adjacency_matrix)
+    same = (weights == weights.T) | (np.isnan(weights) & np.isnan(weights.T))
+    if not same.all():
+        message += f'Your adjacency matrix is not symmetric. Asymmetric entries: {edge_names(list_locations, np.argwhere(np.triu(~same)))}.\n'
+        error = True
 
-    # if failed to create adjacency matrix, terminate
-    if adj_message:
-        message += adj_message
+    # if a location has a road to itself, terminate
+    loops = [i for i in range(len(adjacency_matrix)) if adjacency_matrix[i][i] != 'x']
+    if loops:
+        message += ''.join('The location {} has a road to itself. This is not allowed.\n'.format(i) for i in loops)
         error = True
         return message, error
 
-    if not nx.is_connected(G):
+    # distances over invalid weights mean nothing, and a negative one makes them diverge
+    if bad.any():
+        return message, error
+
+    dist = shortest_distances(weights)
+    if not np.isfinite(dist[0]).all():
         message += 'Your graph is not connected.\n'
         error = True
 
-    if not is_metric(G):
-        message += 'Your graph is not metric.\n'
+    with np.errstate(invalid='ignore'):
+        longer = np.triu(finite & (weights - dist >= METRIC_TOLERANCE), 1)
+    if longer.any():
+        message += f'Your graph is not metric. Edges longer than the shortest path between their ends: {edge_names(list_locations, np.argwhere(longer))}.\n'
         error = True
 
-    if not message:
-        message = "If you've received no other error messages, then your input is valid!\n\n\n"
     return message, error
 
 
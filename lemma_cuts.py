@@ -0,0 +1,96 @@
+# the structural lemmas checked after the fact in lemmas.py, added to the ILP as optional families of constraints
+
+import numpy as np
+from mip import xsum
+
+# family name -> solver.py flag that switches it on
+LEMMA_FLAGS = {
+	"reverse": "--lemma-reverse",
+	"walk": "--lemma-walk",
+	"closest": "--lemma-closest",
+}
+
+# Families that can cut off every optimal solution of some inputs, so a model using them proves nothing
+HEURISTIC_LEMMAS = {"reverse"}
+
+# Closest-dropoff constraints are added for this many of the vertices nearest to each home
+CLOSEST_VERTICES = 4
+
+def lemmas_from_params(lemmas, params):
+	"""
+	Input:
+		lemmas: Families the solver always adds
+		params: Extra arguments passed to solver.py
+	Output:
+		The families switched on by either, in LEMMA_FLAGS order
+	"""
+	return [name for name, flag in LEMMA_FLAGS.items() if name in lemmas or flag in params]
+
+def add_reverse_edge_cuts(model, x, inc):
+	"""
+	The car drives along at most one direction of every edge, x_uv + x_vu <= 1 (noSameEdge, extended to both directions).
+	This is not a lemma: two TAs living at a leaf next to the start are cheapest to drive there and back.
+	The family only restricts the search, and results found with it are not recorded as optimal.
+	Input:
+		model: The MIP model
+		x: Car edge variables, one per directed edge of inc
+		inc: EdgeIncidence of the graph
+	Output:
+		Number of constraints added
+	"""
+	count = 0
+	for i, (u, v, w) in enumerate(inc.E):
+		if u < v:
+			model += x[i] + x[inc.edge_id[(v, u)]] <= 1
+			count += 1
+	return count
+
+def add_walk_cuts(model, x, t, inc):
+	"""
+	Every directed edge is used by at most one of the car and the TAs (twoTAWalk). Two TAs walking
+	along an edge would do better if the car drove them across it and back, and a TA walking along an
+	edge the car drives would do better getting off at its far end.
+	Input:
+		model: The MIP model
+		x: Car edge variables, one per directed edge of inc
+		t: t[k][j] is whether the kth TA walks along directed edge j
+		inc: EdgeIncidence of the graph
+	Output:
+		Number of constraints added
+	"""
+	for j in range(len(inc.E)):
+		model += xsum(t_k[j] for t_k in t) + x[j] <= 1
+	return len(inc.E)
+
+def add_closest_dropoff_cuts(model, x, drops, inc, dist, home_indices, starting_car_index):
+	"""
+	Every TA gets off at the car-visited vertex closest to their home (closeTAs). A TA never gets off
+	further from home than the start, and if the car drives into one of the vertices nearest to
+	the home, the TA gets off there or somewhere at least as close.
+	Input:
+		model: The MIP model
+		x: Car edge variables, one per directed edge of inc
+		drops: drops[k][v] is whether the kth TA gets off at vertex v
+		inc: EdgeIncidence of the graph
+		dist: Shortest distances between all vertices of the graph
+		home_indices: The indices of the vertices in the graph that are TA homes
+		starting_car_index: The index of the car's starting vertex
+	Output:
+		Number of constraints added, and number of dropoff variables fixed to zero
+	"""
+	count, fixed = 0, 0
+	for k, home in enumerate(home_indices):
+		to_home = dist[:, home]
+
+		for v in np.flatnonzero(to_home > to_home[starting_car_index]):
+			drops[k][v].ub = 0
+			fixed += 1
+
+		for w in np.argsort(to_home, kind='stable')[:CLOSEST_VERTICES]:
+			if w == starting_car_index:
+				continue
+			closer = xsum(drops[k][v] for v in np.flatnonzero(to_home <= to_home[w]))
+			for i in inc.in_edges[w]:
+				model += closer >= x[i]
+				count += 1
+	return count, fixed
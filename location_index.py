@@ -0,0 +1,54 @@
+# name <-> index lookups for an input's locations, built once per input
+
+class LocationIndex(tuple):
+	"""
+	The location names in graph order (index -> name), with a name -> index dictionary so that
+	membership tests and index lookups are O(1) instead of list scans. Being a tuple, it can be
+	passed anywhere a list_of_locations is expected.
+	"""
+
+	def __new__(cls, list_of_locations):
+		"""
+		Input:
+			list_of_locations: A list of locations such that node i of the graph corresponds to name at index i of the list
+		"""
+		self = super().__new__(cls, list_of_locations)
+
+		# position[name] is the first index holding name, matching list.index
+		self.position = {}
+		for i, name in enumerate(self):
+			self.position.setdefault(name, i)
+		return self
+
+	def __contains__(self, name):
+		return name in self.position
+
+	def index(self, name):
+		""" Index of the location, raising ValueError like list.index if there is none """
+		if name not in self.position:
+			raise ValueError('{} is not a location'.format(name))
+		return self.position[name]
+
+	def get(self, name):
+		""" Index of the location, or None if there is none """
+		return self.position.get(name)
+
+	def indices(self, names):
+		""" Indices of the given location names, None for names that aren't locations """
+		position = self.position
+		return [position.get(name) for name in names]
+
+	def names(self, indices):
+		""" Names of the locations at the given indices """
+		return [self[i] for i in indices]
+
+def get_location_index(list_of_locations):
+	"""
+	Input:
+		list_of_locations: A list of locations, or a LocationIndex
+	Output:
+		LocationIndex over the locations, the argument itself if it already is one
+	"""
+	if isinstance(list_of_locations, LocationIndex):
+		return list_of_locations
+	return LocationIndex(list_of_locations)
@@ -6,26 +6,27 @@ sys.path.append('../..')
 import argparse
 import utils
 from student_utils import *
+from evaluator import get_evaluator
+from location_index import get_location_index
+from input_cache import read_input
 import input_validator
 import os
 
 def validate_output_nm(input_file, output_file, params=[]):
-    input_data = utils.read_file(input_file)
     output_data = utils.read_file(output_file)
 
     input_message, input_error = input_validator.tests(input_file)
-    cost, message = tests(input_data, output_data, params=params)
+    cost, message = tests(None, output_data, params=params, parsed_input=read_input(input_file))
 
     return cost
 
 def validate_output(input_file, output_file, params=[]):
     print('Processing', input_file)
 
-    input_data = utils.read_file(input_file)
     output_data = utils.read_file(output_file)
 
     input_message, input_error = input_validator.tests(input_file)
-    cost, message = tests(input_data, output_data, params=params)
+    cost, message = tests(None, output_data, params=params, parsed_input=read_input(input_file))
     message = 'Comments about input file:\n\n' + input_message + 'Comments about output file:\n\n' + message
 
     print(message)
@@ -53,8 +54,12 @@ def validate_all_outputs(input_directory, output_directory, params=[]):
     return all_results
 
 
-def tests(input_data, output_data, params=[]):
-    number_of_locations, number_of_houses, list_of_locations, list_of_houses, starting_location, adjacency_matrix = data_parser(input_data)
+def tests(input_data, output_data, params=[], parsed_input=None):
+    if parsed_input is None:
+        parsed_input = data_parser(input_data)
+    number_of_locations, number_of_houses, list_of_locations, list_of_houses, starting_location, adjacency_matrix = parsed_input
+    locations = get_location_index(list_of_locations)
+    houses = set(list_of_houses)
     try:
         G, message = adjacency_matrix_to_graph(adjacency_matrix)
     except Exception:
@@ -68,37 +73,40 @@ def tests(input_data, output_data, params=[]):
         cost = 'infinite'
         return cost, message
     targets = []
+    seen_targets = set()
+    car_cycle_names = set(car_cycle)
     dropoffs = {}
     for i in range(num_dropoffs):
         dropoff = output_data[i + 2]
-        if dropoff[0] not in list_of_locations:
+        if dropoff[0] not in locations:
             message += 'At least one dropoff location is not an actual location.\n'
             cost = 'infinite'
-        if dropoff[0] not in car_cycle:
+        if dropoff[0] not in car_cycle_names:
             message += 'At least one dropoff location is not in the path of the car.\n'
             cost = 'infinite'
-        dropoff_index = list_of_locations.index(dropoff[0])
-        if list_of_locations.index(dropoff[0]) in dropoffs.keys():
+        dropoff_index = locations.index(dropoff[0])
+        if dropoff_index in dropoffs.keys():
             message += 'You have multiple dropoffs with the same location. Please compress them so that there is one dropoff'
             cost = 'infinite'
-        dropoffs[dropoff_index] = convert_locations_to_indices(dropoff[1:], list_of_locations)
+        dropoffs[dropoff_index] = locations.indices(dropoff[1:])
         if len(dropoff) == 1:
             message += 'One dropoff location has nobody getting off; it should not be included in the list of dropoffs.\n'
             cost = 'infinite'
         for target in dropoff[1:]:
-            if target not in list_of_houses:
+            if target not in houses:
                 message += 'One of the targets is not a house.\n'
                 cost = 'infinite'
-            if target in targets:
+            if target in seen_targets:
                 message += 'One of the targets got off at multiple dropoffs'
                 cost = 'infinite'
             targets.append(target)
+            seen_targets.add(target)
 
-    if any(target not in list_of_locations for target in targets):
+    if any(target not in locations for target in targets):
         message += 'At least one of the targets is not a valid location.\n'
         cost = 'infinite'
 
-    if any(home not in targets for home in list_of_houses):
+    if any(home not in seen_targets for home in list_of_houses):
         message += 'At least one student did not get home.\n'
         cost = 'infinite'
 
@@ -106,14 +114,14 @@ def tests(input_data, output_data, params=[]):
         message += "Your car must start at the specified starting location.\n"
         cost = 'infinite'
 
-    car_cycle = convert_locations_to_indices(car_cycle, list_of_locations)
+    car_cycle = locations.indices(car_cycle)
 
     if (car_cycle[0] != car_cycle[-1]):
         message += "Your car must start and end at the same location.\n"
         cost = 'infinite'
 
     if cost != 'infinite':
-        cost, solution_message = cost_of_solution(G, car_cycle, dropoffs)
+        cost, solution_message = get_evaluator(G).cost_of_solution(car_cycle, dropoffs)
         message += solution_message
 
     return cost, message
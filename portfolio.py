@@ -0,0 +1,215 @@
+# races several solvers on one input in parallel processes, sharing the best tour found, until one proves it optimal
+
+import time
+import random
+import ctypes
+import multiprocessing
+from queue import Empty
+from results_store import get_store
+from run_log import flush_logs
+from evaluator import get_evaluator
+from location_index import get_location_index
+from student_utils import adjacency_matrix_to_graph
+from solver_toolbox import BaseSolver, ILPSolver, LocalSearchSolver
+
+# Length of an ILP member's first round, the rounds between which it picks up the shared tour, doubling every round
+ROUND_SECONDS = 30
+
+# The shared tour can hold up to this many vertices per location of the input
+TOUR_CAPACITY = 4
+
+class SharedIncumbent:
+	"""
+	The cheapest tour any member has found, in shared memory, and the flag that stops every member.
+	Created before the members are started, so they all inherit it.
+	"""
+
+	def __init__(self, num_locations, round_seconds=ROUND_SECONDS):
+		"""
+		Input:
+			num_locations: Number of locations of the input, bounding the length of a useful tour
+			round_seconds: Length of an ILP member's first round
+		"""
+		self.round_seconds = round_seconds
+		self.lock = multiprocessing.Lock()
+		self.cost = multiprocessing.Value(ctypes.c_double, float('inf'), lock=False)
+		self.length = multiprocessing.Value(ctypes.c_int, 0, lock=False)
+		self.tour = multiprocessing.Array(ctypes.c_int, TOUR_CAPACITY * num_locations + 1, lock=False)
+		self.stop = multiprocessing.Event()
+
+	def offer(self, cost, car_path):
+		"""
+		Input:
+			cost: Cost of the solution driving along car_path
+			car_path: List of vertices of the car's closed walk
+		Output:
+			Whether the tour was cheaper than the shared one and replaced it
+		"""
+		if len(car_path) > len(self.tour):
+			return False
+		with self.lock:
+			if cost >= self.cost.value - 1e-9:
+				return False
+			self.cost.value = cost
+			self.length.value = len(car_path)
+			self.tour[:len(car_path)] = car_path
+			return True
+
+	def get(self):
+		""" Cost of the shared tour and its list of vertices, or (inf, None) before any member shared one """
+		with self.lock:
+			if self.length.value == 0:
+				return self.cost.value, None
+			return self.cost.value, list(self.tour[:self.length.value])
+
+def restart_search(list_of_locations, list_of_homes, starting_car_location, adjacency_matrix, timeout, incumbent, seed=None):
+	"""
+	Local search from random sets of homes until the timeout or until stopped, sharing every improvement.
+	Input:
+		timeout: Seconds to search for, or -1 for no limit
+		incumbent: SharedIncumbent of the portfolio
+		seed: Seed of the random sets
+	Output:
+		The cheapest solution found, as (cost, car path, dropoffs)
+	"""
+	locations = get_location_index(list_of_locations)
+	home_indices = locations.indices(list_of_homes)
+	starting_car_index = locations.index(starting_car_location)
+	G, message = adjacency_matrix_to_graph(adjacency_matrix)
+	evaluator = get_evaluator(G)
+	solver = LocalSearchSolver()
+	rng = random.Random(seed)
+
+	deadline = time.time() + timeout if timeout != -1 else None
+	best = (float('inf'), [], {})
+	while not incumbent.stop.is_set() and (deadline is None or time.time() < deadline):
+		stops = rng.sample(home_indices, rng.randint(0, len(home_indices)))
+		car_path = solver.local_search(G, home_indices, starting_car_index, initial_stops=stops)
+		walk_cost, dropoffs = solver.find_best_dropoffs(G, home_indices, car_path)
+		cost, message = evaluator.cost_of_solution(car_path, dropoffs)
+		if cost < best[0] - 1e-9:
+			best = (cost, car_path, dropoffs)
+			if incumbent.offer(cost, car_path):
+				print("Random restart found cost", cost)
+	return best
+
+def member_worker(name, solver, problem, input_file, params, incumbent, results):
+	"""
+	Run one member of the portfolio and report its solution. Started in its own process.
+	Input:
+		name: The member's name
+		solver: The member's solver, or None for the random restart search
+		problem: (list_of_locations, list_of_homes, starting_car_location, adjacency_matrix)
+		input_file: The input's file name
+		params: Extra arguments passed to the solver
+		incumbent: SharedIncumbent of the portfolio
+		results: Queue the member puts its (name, cost, car path, dropoffs) on
+	"""
+	try:
+		if solver is None:
+			timeout = int(params[params.index("-t") + 1]) if "-t" in params else 300
+			solution = restart_search(*problem, timeout, incumbent, seed=input_file)
+			store = get_store()
+			if solution[1]:
+				with store.transaction():
+					store.record_solution(input_file, solution[1], solution[2], solution[0])
+					store.record(input_file, solution[0], False)
+		else:
+			if isinstance(solver, ILPSolver):
+				solver.incumbent = incumbent
+			solution = solver.solve(*problem, input_file, params)
+			if solution[1]:
+				incumbent.offer(solution[0], solution[1])
+	except Exception as e:
+		print("Portfolio member {} failed: {}".format(name, e))
+		solution = (float('inf'), [], {})
+	finally:
+		# member processes exit without running atexit handlers
+		flush_logs()
+	results.put((name, solution[0], solution[1], solution[2]))
+
+class PortfolioSolver(BaseSolver):
+	def __init__(self, members):
+		"""
+		Input:
+			members: Dictionary mapping member name to its solver, or to None for the random restart search
+		"""
+		self.members = members
+
+	def solve(self, list_of_locations, list_of_homes, starting_car_location, adjacency_matrix, input_file, params=[]):
+		"""
+		Race the members in parallel processes, sharing the cheapest tour, and stop them all once the best
+		known cost is proven optimal: by a member, or by a stored bound reaching it.
+		Input:
+			list_of_locations: A list of locations such that node i of the graph corresponds to name at index i of the list
+			list_of_homes: A list of homes
+			starting_car_location: The name of the starting location for the car
+			adjacency_matrix: The adjacency matrix from the input file
+		Output:
+			A cost of how expensive the current solution is
+			A list of locations representing the car path
+			A dictionary mapping drop-off location to a list of homes of TAs that got off at that particular location
+			NOTE: all outputs should be in terms of indices not the names of the locations themselves
+		"""
+		# the workers of a multiprocessing pool are daemonic, and daemonic processes can't start the members
+		if multiprocessing.current_process().daemon:
+			raise ValueError('The portfolio starts a process per member, so it can\'t run in a pooled worker: run it without --jobs or the scheduler')
+
+		names = list(self.members)
+		if "--portfolio" in params:
+			names = params[params.index("--portfolio") + 1].split(",")
+
+		# with more homes than dropoffs it considers, branch and bound can't prove anything and only takes cores from the others
+		bf = self.members.get("bf")
+		if "bf" in names and bf is not None and len(list_of_homes) > bf.max_dropoffs:
+			print("Skipping bf, the input has more than {} homes".format(bf.max_dropoffs))
+			names = [name for name in names if name != "bf"]
+
+		# the members split the machine's cores
+		if "--threads" not in params:
+			params = params + ["--threads", str(max(1, multiprocessing.cpu_count() // len(names)))]
+
+		problem = (list_of_locations, list_of_homes, starting_car_location, adjacency_matrix)
+		incumbent = SharedIncumbent(len(list_of_locations))
+		results = multiprocessing.Queue()
+		processes = {}
+		for name in names:
+			process = multiprocessing.Process(target=member_worker, args=(name, self.members[name], problem, input_file, params, incumbent, results))
+			process.start()
+			processes[name] = process
+
+		store = get_store()
+		best_solution = (float('inf'), [], {})
+		start = time.time()
+		try:
+			while processes:
+				try:
+					name, cost, car_path, dropoffs = results.get(timeout=1)
+				except Empty:
+					# a member that died without reporting is given up on
+					for name in [name for name, process in processes.items() if not process.is_alive() and results.empty()]:
+						print("Portfolio member {} exited without a solution".format(name))
+						del processes[name]
+					continue
+
+				# the member may already have been given up on if it exited before its result was read
+				process = processes.pop(name, None)
+				if process is not None:
+					process.join()
+				print("Portfolio member {} finished after {:.2f}s with cost {}".format(name, time.time() - start, cost))
+				if cost < best_solution[0]:
+					best_solution = (cost, car_path, dropoffs)
+
+				objective, optimal = store.get(input_file) or (None, False)
+				bound = store.bound(input_file)
+				if objective is not None and (optimal or (bound is not None and bound >= objective - 1e-9)):
+					print("Cost {} is proven optimal, stopping {}".format(objective, ", ".join(processes) or "nothing"))
+					break
+		finally:
+			incumbent.stop.set()
+			for process in processes.values():
+				process.terminate()
+			for process in processes.values():
+				process.join()
+
+		return best_solution
@@ -0,0 +1,134 @@
+# graph reductions applied before the MIP is built, and the mapping of its solutions back to the input graph
+
+import networkx as nx
+import numpy as np
+from distance_oracle import get_oracle
+from incidence import get_incidence
+
+class GraphReduction:
+	"""
+	Shrinks a graph without changing its optimal cost. Distances between the remaining vertices are unchanged.
+	- A region behind a bridge with no homes is removed: neither the car nor any TA has a reason to enter it.
+	- A region behind a bridge with one home is kept for walking, but the car may not enter it: cutting the
+	  excursion saves 4/3 of the distance driven into the region, more than the one TA has to walk extra.
+	- A non-home vertex of degree two is contracted into an edge between its neighbours u and w when at most
+	  one home is closer to it than to u, and at most one than to w. Driving through it is then no better than
+	  the contracted edge and dropping at u or w, and turning back at it saves less walking than the detour costs.
+	"""
+
+	def __init__(self, G, home_indices, starting_car_index):
+		"""
+		Input:
+			G: A NetworkX graph with integer nodes 0..n-1 and 'weight' edge attributes
+			home_indices: The indices of the vertices in G that are TA homes
+			starting_car_index: The index of the car's starting vertex
+		"""
+		self.input_graph = G
+		keep = set(home_indices) | {starting_car_index}
+		homes = np.array(sorted(set(home_indices)), dtype=int)
+		dist = get_oracle(G).dist
+
+		# every bridge is a DFS tree edge from the start, and its far side is the child's subtree
+		tree = nx.dfs_tree(G, starting_car_index)
+		removed, car_free = set(), set()
+		for a, b in nx.bridges(G):
+			child = b if tree.has_edge(a, b) else a
+			if child in removed:
+				continue
+			side = nx.descendants(tree, child) | {child}
+			num_homes = len(side & keep)
+			if num_homes == 0:
+				removed |= side
+			elif num_homes == 1:
+				car_free |= side
+		car_free -= removed
+
+		# adj[u][w] is the weight of the current edge between u and w, path[(u, w)] the input vertices it runs along
+		adj = {v: {} for v in G.nodes if v not in removed}
+		path = {}
+		for u, w, weight in G.edges(data='weight'):
+			if u in adj and w in adj:
+				adj[u][w] = adj[w][u] = weight
+				path[(u, w)], path[(w, u)] = [u, w], [w, u]
+
+		def contractible(v):
+			if v in keep or len(adj[v]) != 2:
+				return False
+			return all(np.sum(dist[v, homes] < dist[u, homes]) <= 1 for u in adj[v])
+
+		contracted = set()
+		queue = list(adj)
+		while queue:
+			v = queue.pop()
+			if v in contracted or not contractible(v):
+				continue
+			u, w = adj[v]
+			weight = adj[u][v] + adj[v][w]
+			through = path[(u, v)] + path[(v, w)][1:]
+			del adj[u][v], adj[w][v], adj[v], path[(u, v)], path[(v, u)], path[(v, w)], path[(w, v)]
+			contracted.add(v)
+
+			# an existing edge at least as short makes the route through v redundant
+			if w not in adj[u] or weight < adj[u][w]:
+				adj[u][w] = adj[w][u] = weight
+				path[(u, w)], path[(w, u)] = through, through[::-1]
+			queue += [u, w]
+
+		# original[i] is the input vertex of reduced vertex i
+		self.original = sorted(adj)
+		self.label = {v: i for i, v in enumerate(self.original)}
+		self.path = path
+
+		self.G = nx.Graph()
+		self.G.add_nodes_from(range(len(self.original)))
+		self.G.add_weighted_edges_from((self.label[u], self.label[w], weight) for u in adj for w, weight in adj[u].items() if u < w)
+
+		self.home_indices = [self.label[h] for h in home_indices]
+		self.starting_car_index = self.label[starting_car_index]
+		self.car_free = set(self.label[v] for v in car_free if v in self.label)
+		self.num_removed = len(removed)
+		self.num_contracted = len(contracted)
+
+	def fixed_edges(self):
+		""" Indices, in the reduced graph's incidence, of the directed edges the car never drives along """
+		inc = get_incidence(self.G)
+		return [i for i, (u, v, w) in enumerate(inc.E) if u in self.car_free or v in self.car_free]
+
+	def expand_path(self, car_path):
+		"""
+		Input:
+			car_path: A walk in the reduced graph
+		Output:
+			The same walk in the input graph
+		"""
+		if not car_path:
+			return []
+		expanded = [self.original[car_path[0]]]
+		for a, b in zip(car_path, car_path[1:]):
+			expanded += self.path[(self.original[a], self.original[b])][1:]
+		return expanded
+
+	def reduce_path(self, car_path):
+		"""
+		Input:
+			car_path: A closed walk in the input graph
+		Output:
+			A closed walk in the reduced graph through the same remaining vertices, no longer than the input walk
+		"""
+		stops = [self.label[v] for v in car_path if v in self.label]
+		oracle = get_oracle(self.G)
+		reduced = stops[:1]
+		for a, b in zip(stops, stops[1:]):
+			if a != b:
+				reduced += oracle.path(a, b)[1:]
+		return reduced
+
+	def report(self):
+		""" Sizes of the input and reduced graphs, in vertices and directed edges """
+		return {
+			"vertices": [self.input_graph.number_of_nodes(), self.G.number_of_nodes()],
+			"edges": [2 * self.input_graph.number_of_edges(), 2 * self.G.number_of_edges()],
+			"removed": self.num_removed,
+			"contracted": self.num_contracted,
+			"fixed": len(self.fixed_edges()),
+		}
@@ -0,0 +1,352 @@
+# the models table of best known costs, the solutions table of best tours, the bounds and naive baselines they are measured against, and cached input checks, behind one long-lived connection per process
+
+import os
+import sqlite3
+import numpy as np
+from contextlib import contextmanager
+
+# Seconds to wait on a locked models.sqlite, since parallel workers share the file
+DB_TIMEOUT = 120
+
+DEFAULT_PATH = 'models.sqlite'
+
+CREATE_MODELS = 'CREATE TABLE IF NOT EXISTS models (input_file TEXT PRIMARY KEY, best_objective_bound NUMERIC, optimal INTEGER)'
+
+SELECT_RESULT = 'SELECT best_objective_bound, optimal FROM models WHERE input_file = ?'
+
+SELECT_ALL = 'SELECT input_file, best_objective_bound, optimal FROM models ORDER BY input_file'
+
+# Costs within this relative difference of each other are the same cost, found again with float noise
+COST_TOLERANCE = 1e-9
+
+# keep the stored row unless the new cost is lower beyond the tolerance, or the same cost and newly proven optimal;
+# the same cost never clears a proven optimal flag
+RECORD_RESULT = '''
+	INSERT INTO models (input_file, best_objective_bound, optimal) VALUES (:input_file, :objective, :optimal)
+	ON CONFLICT (input_file) DO UPDATE SET
+		best_objective_bound = CASE WHEN excluded.best_objective_bound < models.best_objective_bound - :tolerance * ABS(models.best_objective_bound)
+			THEN excluded.best_objective_bound ELSE models.best_objective_bound END,
+		optimal = CASE WHEN excluded.best_objective_bound < models.best_objective_bound - :tolerance * ABS(models.best_objective_bound)
+			THEN excluded.optimal ELSE MAX(models.optimal, excluded.optimal) END
+	WHERE excluded.best_objective_bound < models.best_objective_bound - :tolerance * ABS(models.best_objective_bound)
+		OR (excluded.best_objective_bound <= models.best_objective_bound + :tolerance * ABS(models.best_objective_bound)
+			AND excluded.optimal > models.optimal)
+'''
+
+SET_RESULT = '''
+	INSERT INTO models (input_file, best_objective_bound, optimal) VALUES (?, ?, ?)
+	ON CONFLICT (input_file) DO UPDATE SET best_objective_bound = excluded.best_objective_bound, optimal = excluded.optimal
+'''
+
+CLEAR_OPTIMAL = 'UPDATE models SET optimal = 0 WHERE input_file = ?'
+
+# Number of distinct tours kept per input in the solutions table
+TOP_K = 5
+
+# tour and dropoffs are little-endian uint16 vertex arrays, see encode_solution
+CREATE_SOLUTIONS = '''
+	CREATE TABLE IF NOT EXISTS solutions (input_file TEXT, tour BLOB, dropoffs BLOB, objective REAL, bound REAL,
+		PRIMARY KEY (input_file, tour))
+'''
+
+SELECT_SOLUTIONS = 'SELECT tour, dropoffs, objective, bound FROM solutions WHERE input_file = ? ORDER BY objective LIMIT ?'
+
+# the same tour found again keeps its lower cost and higher bound
+RECORD_SOLUTION = '''
+	INSERT INTO solutions (input_file, tour, dropoffs, objective, bound) VALUES (?, ?, ?, ?, ?)
+	ON CONFLICT (input_file, tour) DO UPDATE SET
+		dropoffs = CASE WHEN excluded.objective < solutions.objective THEN excluded.dropoffs ELSE solutions.dropoffs END,
+		objective = MIN(solutions.objective, excluded.objective),
+		bound = MAX(COALESCE(solutions.bound, excluded.bound), COALESCE(excluded.bound, solutions.bound))
+'''
+
+TRIM_SOLUTIONS = '''
+	DELETE FROM solutions WHERE input_file = ? AND rowid NOT IN
+		(SELECT rowid FROM solutions WHERE input_file = ? ORDER BY objective LIMIT ?)
+'''
+
+# one lower bound per input per method (e.g. radius, steiner, lp, mip), each only ever raised
+CREATE_BOUNDS = 'CREATE TABLE IF NOT EXISTS bounds (input_file TEXT, method TEXT, bound REAL, PRIMARY KEY (input_file, method))'
+
+RECORD_BOUND = '''
+	INSERT INTO bounds (input_file, method, bound) VALUES (?, ?, ?)
+	ON CONFLICT (input_file, method) DO UPDATE SET bound = MAX(bounds.bound, excluded.bound)
+'''
+
+SELECT_BOUND = 'SELECT MAX(bound) FROM bounds WHERE input_file = ?'
+
+SELECT_BOUNDS = 'SELECT method, bound FROM bounds WHERE input_file = ? ORDER BY method'
+
+# every input with a stored cost, with its best bound (NULL if it has none)
+SELECT_GAPS = '''
+	SELECT models.input_file, models.best_objective_bound, models.optimal, MAX(bounds.bound)
+	FROM models LEFT JOIN bounds ON bounds.input_file = models.input_file
+	GROUP BY models.input_file ORDER BY models.input_file
+'''
+
+# cost of the naive solution (every TA walks home from the start), which damage is measured against
+CREATE_BASELINES = 'CREATE TABLE IF NOT EXISTS baselines (input_file TEXT PRIMARY KEY, naive REAL)'
+
+SET_BASELINE = 'INSERT OR REPLACE INTO baselines (input_file, naive) VALUES (?, ?)'
+
+SELECT_BASELINE = 'SELECT naive FROM baselines WHERE input_file = ?'
+
+SELECT_BASELINES = 'SELECT input_file, naive FROM baselines'
+
+# result of input_validator.content_tests for each input file contents, keyed by the SHA-1 of the file
+CREATE_INPUT_CHECKS = 'CREATE TABLE IF NOT EXISTS input_checks (digest TEXT PRIMARY KEY, valid INTEGER, message TEXT)'
+
+SET_INPUT_CHECK = 'INSERT OR REPLACE INTO input_checks (digest, valid, message) VALUES (?, ?, ?)'
+
+SELECT_INPUT_CHECK = 'SELECT valid, message FROM input_checks WHERE digest = ?'
+
+VERTEX_TYPE = np.dtype('<u2')
+
+def encode_solution(car_path, dropoffs):
+	"""
+	Input:
+		car_path: The car's closed walk, in terms of indices
+		dropoffs: A dictionary mapping drop-off location to a list of homes of TAs that got off there
+	Output:
+		The tour as bytes
+		The dropoffs as bytes, each dropoff followed by its number of TAs and their homes
+	"""
+	flat = []
+	for dropoff, homes in dropoffs.items():
+		flat += [dropoff, len(homes)] + list(homes)
+	return np.array(car_path, dtype=VERTEX_TYPE).tobytes(), np.array(flat, dtype=VERTEX_TYPE).tobytes()
+
+def decode_solution(tour, dropoffs):
+	""" The car path and dropoff dictionary encoded by encode_solution """
+	car_path = np.frombuffer(tour, dtype=VERTEX_TYPE).tolist()
+	flat = np.frombuffer(dropoffs, dtype=VERTEX_TYPE).tolist()
+	mapping = {}
+	i = 0
+	while i < len(flat):
+		mapping[flat[i]] = flat[i + 2:i + 2 + flat[i + 1]]
+		i += 2 + flat[i + 1]
+	return car_path, mapping
+
+def relative_gap(objective, optimal, bound):
+	""" (objective - bound) / objective, 0 for a proven optimal objective, or None without a bound """
+	if optimal:
+		return 0.0
+	if bound is None or objective is None:
+		return None
+	return max(0.0, (objective - bound) / objective) if objective else 0.0
+
+class Solution:
+	""" A stored solution of one input """
+
+	def __init__(self, car_path, dropoffs, objective, bound):
+		"""
+		Input:
+			car_path: The car's closed walk, in terms of indices
+			dropoffs: A dictionary mapping drop-off location to a list of homes of TAs that got off there
+			objective: The solution's cost
+			bound: Lower bound on the input's optimal cost proven by the solver that found it, or None
+		"""
+		self.car_path = car_path
+		self.dropoffs = dropoffs
+		self.objective = objective
+		self.bound = bound
+
+class ResultsStore:
+	"""
+	Reads and writes the models table of best costs, the solutions table of best tours, the bounds table, the baselines table and the input checks table. The database is put in WAL mode so readers never block
+	the writer, and every write runs in a BEGIN IMMEDIATE transaction so solver processes sharing
+	the file queue up on the lock instead of failing.
+	"""
+
+	def __init__(self, path=DEFAULT_PATH, timeout=DB_TIMEOUT):
+		"""
+		Input:
+			path: The SQLite file holding the models table
+			timeout: Seconds to wait for other processes to release the file
+		"""
+		self.path = path
+		self.pid = os.getpid()
+
+		# autocommit, so transactions are only the ones opened by transaction()
+		self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+		self.conn.execute('PRAGMA journal_mode = WAL')
+		self.conn.execute('PRAGMA synchronous = NORMAL')
+		self.conn.execute(CREATE_MODELS)
+		self.conn.execute(CREATE_SOLUTIONS)
+		self.conn.execute(CREATE_BOUNDS)
+		self.conn.execute(CREATE_BASELINES)
+		self.conn.execute(CREATE_INPUT_CHECKS)
+		self.depth = 0
+
+	@contextmanager
+	def transaction(self):
+		""" Group the writes made inside the block into one transaction. Nested blocks join the outermost one. """
+		if self.depth == 0:
+			self.conn.execute('BEGIN IMMEDIATE')
+		self.depth += 1
+		try:
+			yield self
+		except BaseException:
+			self.depth -= 1
+			if self.depth == 0:
+				self.conn.execute('ROLLBACK')
+			raise
+		self.depth -= 1
+		if self.depth == 0:
+			self.conn.execute('COMMIT')
+
+	def get(self, input_file):
+		"""
+		Input:
+			input_file: The input's file name, e.g. 1_50.in
+		Output:
+			(best_objective_bound, optimal) for the input, or None if it has no result yet
+		"""
+		return self.conn.execute(SELECT_RESULT, (input_file,)).fetchone()
+
+	def best_objective(self, input_file):
+		""" The best known cost of the input, or None if it has no result yet """
+		result = self.get(input_file)
+		return result[0] if result else None
+
+	def is_optimal(self, input_file):
+		""" Whether the stored result for the input is proven optimal """
+		result = self.get(input_file)
+		return bool(result and result[1])
+
+	def all(self):
+		""" Every (input_file, best_objective_bound, optimal) row, ordered by input file """
+		return self.conn.execute(SELECT_ALL).fetchall()
+
+	def record(self, input_file, objective, optimal):
+		"""
+		Store a solution's cost if it beats the stored one by more than COST_TOLERANCE, or proves the same cost optimal.
+		Input:
+			input_file: The input's file name
+			objective: The solution's cost
+			optimal: Whether the solution is proven optimal
+		Output:
+			Whether the stored row was written
+		"""
+		with self.transaction():
+			cursor = self.conn.execute(RECORD_RESULT, {"input_file": input_file, "objective": objective, "optimal": int(bool(optimal)), "tolerance": COST_TOLERANCE})
+		return cursor.rowcount > 0
+
+	def set(self, input_file, objective, optimal):
+		""" Overwrite the stored result for the input, whether or not it is better """
+		with self.transaction():
+			self.conn.execute(SET_RESULT, (input_file, objective, int(bool(optimal))))
+
+	def clear_optimal(self, input_file):
+		""" Mark the stored result for the input as not proven optimal """
+		with self.transaction():
+			self.conn.execute(CLEAR_OPTIMAL, (input_file,))
+
+	def solutions(self, input_file, k=TOP_K):
+		"""
+		Input:
+			input_file: The input's file name
+			k: How many solutions to return
+		Output:
+			Up to k stored Solutions with distinct tours, cheapest first
+		"""
+		rows = self.conn.execute(SELECT_SOLUTIONS, (input_file, k)).fetchall()
+		return [Solution(*decode_solution(tour, dropoffs), objective, bound) for tour, dropoffs, objective, bound in rows]
+
+	def best_solution(self, input_file):
+		""" The cheapest stored Solution of the input, or None """
+		solutions = self.solutions(input_file, 1)
+		return solutions[0] if solutions else None
+
+	def record_solution(self, input_file, car_path, dropoffs, objective, bound=None, k=TOP_K):
+		"""
+		Keep a solution among the input's k cheapest distinct tours.
+		Input:
+			input_file: The input's file name
+			car_path: The car's closed walk, in terms of indices
+			dropoffs: A dictionary mapping drop-off location to a list of homes of TAs that got off there
+			objective: The solution's cost
+			bound: Lower bound on the input's optimal cost, if the solver proved one
+			k: How many tours to keep for the input
+		"""
+		tour, flat_dropoffs = encode_solution(car_path, dropoffs)
+		with self.transaction():
+			self.conn.execute(RECORD_SOLUTION, (input_file, tour, flat_dropoffs, objective, bound))
+			self.conn.execute(TRIM_SOLUTIONS, (input_file, input_file, k))
+
+	def record_bound(self, input_file, method, bound):
+		"""
+		Store a lower bound on the input's optimal cost, keeping the method's highest one.
+		Input:
+			input_file: The input's file name
+			method: Name of the method that proved the bound
+			bound: The lower bound
+		"""
+		with self.transaction():
+			self.conn.execute(RECORD_BOUND, (input_file, method, float(bound)))
+
+	def bound(self, input_file):
+		""" The best lower bound on the input's optimal cost, or None if it has none """
+		return self.conn.execute(SELECT_BOUND, (input_file,)).fetchone()[0]
+
+	def bounds(self, input_file):
+		""" Dictionary mapping method to the input's best lower bound from that method """
+		return dict(self.conn.execute(SELECT_BOUNDS, (input_file,)).fetchall())
+
+	def gap(self, input_file):
+		"""
+		Input:
+			input_file: The input's file name
+		Output:
+			Relative gap between the best known cost and the best bound, 0 if the cost is proven optimal,
+			or None if the input has no cost or no bound
+		"""
+		result, best = self.get(input_file), self.bound(input_file)
+		return relative_gap(*result, best) if result else None
+
+	def gaps(self):
+		""" Every (input_file, best_objective_bound, optimal, bound, gap) row, ordered by input file """
+		return [row + (relative_gap(*row[1:]),) for row in self.conn.execute(SELECT_GAPS).fetchall()]
+
+	def set_baseline(self, input_file, naive):
+		""" Store the cost of the input's naive solution """
+		with self.transaction():
+			self.conn.execute(SET_BASELINE, (input_file, float(naive)))
+
+	def baseline(self, input_file):
+		""" The cost of the input's naive solution, or None if it hasn't been stored """
+		result = self.conn.execute(SELECT_BASELINE, (input_file,)).fetchone()
+		return result[0] if result else None
+
+	def baselines(self):
+		""" Dictionary mapping every input with a stored naive cost to that cost """
+		return dict(self.conn.execute(SELECT_BASELINES).fetchall())
+
+	def set_input_check(self, key, valid, message):
+		""" Store whether input file contents with the given key (their SHA-1 and the validator version) are valid, and the validator's message """
+		with self.transaction():
+			self.conn.execute(SET_INPUT_CHECK, (key, int(valid), message))
+
+	def input_check(self, key):
+		""" (valid, message) stored for input file contents with the given key, or None if they haven't been checked """
+		result = self.conn.execute(SELECT_INPUT_CHECK, (key,)).fetchone()
+		return (bool(result[0]), result[1]) if result else None
+
+	def close(self):
+		self.conn.close()
+
+# One store per database file per process. Connections can't cross a fork, so a child reopens its own.
+_stores = {}
+
+def get_store(path=DEFAULT_PATH):
+	"""
+	Input:
+		path: The SQLite file holding the models table
+	Output:
+		This process's ResultsStore for the file, opened on first use
+	"""
+	store = _stores.get(path)
+	if store is None or store.pid != os.getpid():
+		store = ResultsStore(path)
+		_stores[path] = store
+	return store
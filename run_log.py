@@ -0,0 +1,194 @@
+# buffered JSON lines log of solver runs, one record per solver per input, and a reader that summarises it
+
+import os
+import sys
+import json
+import time
+import glob
+import atexit
+import ctypes
+import argparse
+import tempfile
+from contextlib import contextmanager
+
+class RunLog:
+	"""
+	Buffers one record per solver run and appends them to a JSON lines file when flushed.
+	Each flush is a single append-mode write, so lines from processes sharing the file never interleave.
+	"""
+
+	def __init__(self, path):
+		"""
+		Input:
+			path: The .jsonl file records are appended to
+		"""
+		self.path = path
+		self.entries = []
+
+	def start(self, input_file, solver):
+		"""
+		Begin a record for one solver working on one input.
+		Input:
+			input_file: The input's file name
+			solver: Name of the solver
+		Output:
+			The record, a dictionary the solver fills in with update()
+		"""
+		entry = {"time": time.time(), "pid": os.getpid(), "input": input_file, "solver": solver, "phases": {}, "notes": []}
+		self.entries.append(entry)
+		return entry
+
+	def flush(self):
+		""" Write every buffered record and empty the buffer """
+		if not self.entries:
+			return
+		lines = ''.join(json.dumps(entry) + '\n' for entry in self.entries)
+		self.entries = []
+		directory = os.path.dirname(self.path)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+		try:
+			os.write(fd, lines.encode())
+		finally:
+			os.close(fd)
+
+# One log per file per process
+_logs = {}
+
+def get_run_log(path):
+	"""
+	Input:
+		path: The .jsonl file records are appended to
+	Output:
+		This process's RunLog for the file
+	"""
+	log = _logs.get(path)
+	if log is None:
+		log = RunLog(path)
+		_logs[path] = log
+	return log
+
+def flush_logs():
+	""" Flush every log of this process, once an input is finished """
+	for log in _logs.values():
+		log.flush()
+
+atexit.register(flush_logs)
+
+@contextmanager
+def capture_output():
+	"""
+	Redirect this process's standard output, including what the C solver library prints, to a temporary file.
+	Yields a list that holds the captured text once the block is done.
+	"""
+	libc = ctypes.CDLL(None)
+	captured = []
+	with tempfile.TemporaryFile(mode='w+') as log:
+		sys.stdout.flush()
+		saved = os.dup(1)
+		os.dup2(log.fileno(), 1)
+		try:
+			yield captured
+		finally:
+			libc.fflush(None)
+			os.dup2(saved, 1)
+			os.close(saved)
+			log.seek(0)
+			captured.append(log.read())
+
+def read_entries(paths):
+	""" Every record in the given .jsonl files, skipping a partially written last line """
+	entries = []
+	for path in paths:
+		with open(path) as f:
+			for line in f:
+				try:
+					entries.append(json.loads(line))
+				except ValueError:
+					pass
+	return entries
+
+def format_entry(entry):
+	""" One line describing a record """
+	line = "{} {:<12} {:<20}".format(time.strftime("%H:%M:%S", time.localtime(entry["time"])), entry["input"], entry["solver"])
+	if "status" in entry:
+		line += " {:<12}".format(entry["status"])
+	for key in ["objective", "bound", "gap"]:
+		if entry.get(key) is not None:
+			line += " {}={:.6g}".format(key, entry[key])
+	if entry["phases"]:
+		line += " " + ", ".join("{}={:.2f}s".format(phase, seconds) for phase, seconds in entry["phases"].items())
+	if entry.get("updated"):
+		line += " updated"
+	if entry["notes"]:
+		line += " (" + "; ".join(entry["notes"]) + ")"
+	return line
+
+def summarise(entries):
+	""" Print totals across all records, and the inputs that are still furthest from optimal """
+	inputs = {}
+	statuses = {}
+	solver_time = 0
+	for entry in entries:
+		statuses[entry.get("status", "unknown")] = statuses.get(entry.get("status", "unknown"), 0) + 1
+		solver_time += sum(entry["phases"].values())
+
+		# keep each input's best objective and best bound across runs
+		best = inputs.setdefault(entry["input"], {"objective": None, "bound": None})
+		if entry.get("objective") is not None and (best["objective"] is None or entry["objective"] < best["objective"]):
+			best["objective"] = entry["objective"]
+		if entry.get("bound") is not None and (best["bound"] is None or entry["bound"] > best["bound"]):
+			best["bound"] = entry["bound"]
+
+	print("{} runs over {} inputs by {} processes, {:.1f} solver hours".format(
+		len(entries), len(inputs), len(set(entry["pid"] for entry in entries)), solver_time / 3600))
+	print("Status: " + ", ".join("{} {}".format(count, status) for status, count in sorted(statuses.items())))
+
+	gaps = []
+	for input_file, best in inputs.items():
+		if best["objective"] and best["bound"] is not None:
+			gaps.append((max(0.0, (best["objective"] - best["bound"]) / best["objective"]), input_file))
+	gaps.sort(reverse=True)
+	if gaps:
+		print("Mean gap {:.3%}, largest:".format(sum(gap for gap, input_file in gaps) / len(gaps)))
+		for gap, input_file in gaps[:10]:
+			print("  {:<12} {:.3%}".format(input_file, gap))
+
+def follow(paths, pattern, interval):
+	""" Print records as they are appended to the log files, picking up new files matching pattern """
+	offsets = {path: 0 for path in paths}
+	while True:
+		for path in sorted(set(offsets) | set(glob.glob(pattern) if pattern else [])):
+			with open(path) as f:
+				f.seek(offsets.get(path, 0))
+				while True:
+					line = f.readline()
+					if not line.endswith('\n'):
+						break
+					offsets[path] = f.tell()
+					try:
+						print(format_entry(json.loads(line)))
+					except ValueError:
+						pass
+		sys.stdout.flush()
+		time.sleep(interval)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Summarise or follow solver run logs')
+	parser.add_argument('logs', type=str, nargs='*', help='The .jsonl log files, by default every file in logfiles/')
+	parser.add_argument('-f', dest='follow', action='store_true', help='Print records as they are written, like tail -f')
+	parser.add_argument('-a', dest='all', action='store_true', help='Print every record before the summary')
+	parser.add_argument('-i', dest='interval', type=float, default=2, help='Seconds between checks for new records with -f')
+	args = parser.parse_args()
+
+	pattern = None if args.logs else 'logfiles/*.jsonl'
+	paths = args.logs or glob.glob(pattern)
+	if args.follow:
+		follow(paths, pattern, args.interval)
+	else:
+		entries = sorted(read_entries(paths), key=lambda entry: entry["time"])
+		if args.all:
+			for entry in entries:
+				print(format_entry(entry))
+		summarise(entries)
@@ -0,0 +1,228 @@
+# hands out solver time to the inputs where it is expected to improve the score the most, resumably
+
+import os
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+import utils
+from input_cache import read_input
+from results_store import get_store, relative_gap
+from evaluator import get_evaluator
+from student_utils import adjacency_matrix_to_graph
+from bounds import compute_bounds
+
+# Timeout of an input's first slice, and the longest slice it can escalate to
+FIRST_TIMEOUT = 60
+MAX_TIMEOUT = 3600
+
+# A slice that improves the cost or the bound multiplies the input's timeout by this much
+ESCALATION = 2
+
+# Every slice in a row that improves nothing multiplies the chance the next one does by this much
+STALL_DECAY = 0.5
+
+# Bounds computed for inputs that have none, since they take milliseconds
+QUICK_BOUNDS = ["radius", "steiner"]
+
+DEFAULT_STATE = 'scheduler_state.json'
+
+class Schedule:
+	"""
+	The scheduler's per-input state: the next slice's timeout, how many slices in a row improved nothing,
+	and the time spent so far. Saved after every slice, so a stopped run resumes where it left off.
+	"""
+
+	def __init__(self, path=DEFAULT_STATE):
+		"""
+		Input:
+			path: The JSON file the state is kept in
+		"""
+		self.path = path
+		self.inputs = {}
+		if os.path.exists(path):
+			with open(path) as f:
+				self.inputs = json.load(f)
+
+	def state(self, input_file):
+		""" The input's state, created with the first slice's timeout if it has none """
+		return self.inputs.setdefault(input_file, {"timeout": FIRST_TIMEOUT, "stalls": 0, "slices": 0, "cpu_seconds": 0.0})
+
+	def update(self, input_file, improved, cpu_seconds):
+		"""
+		Record a finished slice: escalate the timeout of an input that is still improving, and count a stall otherwise.
+		Input:
+			input_file: The input's file name
+			improved: Whether the slice lowered the cost or raised the bound
+			cpu_seconds: CPU time the slice used
+		"""
+		state = self.state(input_file)
+		state["slices"] += 1
+		state["cpu_seconds"] += cpu_seconds
+		if improved:
+			state["timeout"] = min(MAX_TIMEOUT, state["timeout"] * ESCALATION)
+			state["stalls"] = 0
+		else:
+			state["stalls"] += 1
+
+	def save(self):
+		""" Write the state atomically, so stopping the scheduler mid-write never corrupts it """
+		directory = os.path.dirname(os.path.abspath(self.path))
+		fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+		with os.fdopen(fd, 'w') as f:
+			json.dump(self.inputs, f, indent=1, sort_keys=True)
+		os.replace(temp_path, self.path)
+
+	def priority(self, objective, bound, naive, input_file):
+		"""
+		Expected damage removed per CPU-second by the input's next slice: the damage that separates the cost
+		from the bound, times the chance the slice makes progress, over the slice's length.
+		Input:
+			objective: The input's best known cost
+			bound: The input's best lower bound, or None
+			naive: The cost of the input's naive solution
+			input_file: The input's file name
+		Output:
+			The priority, higher first
+		"""
+		state = self.state(input_file)
+		potential = (objective - (bound or 0.0)) / naive * 100.0 if naive else 0.0
+		return max(0.0, potential) * STALL_DECAY ** state["stalls"] / state["timeout"]
+
+def prepare(input_file):
+	"""
+	Input:
+		input_file: path to the .in file
+	Output:
+		The input's path, its naive cost, and its quick bounds
+	"""
+	num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = read_input(input_file)
+	G, message = adjacency_matrix_to_graph(adjacency_matrix)
+	start = list_locations.index(starting_car_location)
+	naive, message = get_evaluator(G).cost_of_solution([start], {start: list_locations.indices(list_houses)})
+	return input_file, naive, compute_bounds(input_file, QUICK_BOUNDS)
+
+def run_slice(task):
+	""" Solve one input for one slice, in a fresh process. Returns the input and the slice's wall time. """
+	input_file, output_directory, params = task
+	from solver import solve_from_file
+	start = time.time()
+	solve_from_file(input_file, output_directory, params=params)
+	return input_file, time.time() - start
+
+def standing(store, input_file_name):
+	""" The input's (best known cost, optimal, best bound) """
+	objective, optimal = store.get(input_file_name) or (None, False)
+	return objective, bool(optimal), store.bound(input_file_name)
+
+def schedule(input_files, output_directory, params, jobs=1, budget=None, state_path=DEFAULT_STATE):
+	"""
+	Repeatedly give the highest priority inputs a slice of solver time until every input is optimal,
+	the budget is spent, or the run is interrupted.
+	Input:
+		input_files: list of paths to .in files
+		output_directory: where improved outputs are written
+		params: extra arguments passed to the solver, e.g. -m ilp
+		jobs: number of slices run at once
+		budget: CPU-seconds to spend in this run, or None to run until stopped
+		state_path: The JSON file the schedule is kept in
+	"""
+	# slices run in pool workers, which can't start the portfolio's member processes
+	if "-m" in params and params[params.index("-m") + 1] == "portfolio":
+		raise ValueError('The portfolio starts a process per member, so it can\'t be scheduled')
+
+	store = get_store()
+	paths = {input_file.split('/')[-1]: input_file for input_file in input_files}
+
+	# naive costs and quick bounds, for the inputs that don't have them yet
+	baselines = store.baselines()
+	missing = [path for name, path in paths.items() if name not in baselines or store.bound(name) is None]
+	if missing:
+		print("Computing naive costs and quick bounds of {} inputs".format(len(missing)))
+		with multiprocessing.Pool(jobs) as pool:
+			for input_file, naive, bounds in pool.imap_unordered(prepare, missing):
+				name = input_file.split('/')[-1]
+				with store.transaction():
+					store.set_baseline(name, naive)
+					for method, (value, seconds) in bounds.items():
+						store.record_bound(name, method, value)
+		baselines = store.baselines()
+
+	plan = Schedule(state_path)
+	threads = max(1, multiprocessing.cpu_count() // jobs)
+	slice_params = params + ["--threads", str(threads)]
+
+	def next_input(running):
+		best, best_priority = None, 0.0
+		for name in paths:
+			if name in running:
+				continue
+			objective, optimal, bound = standing(store, name)
+			if optimal or objective is None:
+				continue
+			priority = plan.priority(objective, bound, baselines.get(name), name)
+			if priority > best_priority:
+				best, best_priority = name, priority
+		return best
+
+	spent = 0.0
+	running = {}
+	pool = multiprocessing.Pool(jobs, maxtasksperchild=1)
+	try:
+		while True:
+			# hand out slices while there are free workers, budget left and inputs worth working on
+			while len(running) < jobs and (budget is None or spent < budget):
+				name = next_input(running)
+				if name is None:
+					break
+				timeout = plan.state(name)["timeout"]
+				objective, optimal, bound = standing(store, name)
+				print("Slice of {}s for {}: cost {:.4f}, gap {}".format(timeout, name, objective,
+					"unknown" if bound is None else "{:.2%}".format(relative_gap(objective, optimal, bound))))
+				task = (paths[name], output_directory, slice_params + ["-t", str(timeout)])
+				running[name] = (pool.apply_async(run_slice, (task,)), (objective, bound))
+
+			if not running:
+				break
+
+			time.sleep(1)
+			for name, (result, before) in list(running.items()):
+				if not result.ready():
+					continue
+				del running[name]
+				try:
+					input_file, seconds = result.get()
+				except Exception as e:
+					print("Slice for {} failed: {}".format(name, e))
+					seconds = 0.0
+				objective, optimal, bound = standing(store, name)
+				improved = optimal or objective < before[0] or (bound is not None and (before[1] is None or bound > before[1]))
+				plan.update(name, improved, seconds * threads)
+				plan.save()
+				spent += seconds * threads
+				print("{} {} after {:.0f}s, cost {:.4f}{}".format(name, "improved" if improved else "stalled", seconds, objective,
+					", optimal" if optimal else ""))
+	except KeyboardInterrupt:
+		print("Stopping, the schedule is saved in", state_path)
+		pool.terminate()
+	else:
+		pool.close()
+	pool.join()
+	plan.save()
+	print("Spent {:.0f} CPU-seconds".format(spent))
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Give solver time to the inputs where it is expected to improve the score the most')
+	parser.add_argument('input_directory', type=str, help='The directory of input files')
+	parser.add_argument('-o', dest='output_directory', type=str, default='submissions/submission_final/', help='Where improved outputs are written')
+	parser.add_argument('--jobs', dest='jobs', type=int, default=1, help='Number of inputs solved at once')
+	parser.add_argument('--budget', dest='budget', type=float, default=None, help='CPU-hours to spend in this run')
+	parser.add_argument('--state', dest='state', type=str, default=DEFAULT_STATE, help='The file the schedule is saved in')
+
+	# every other argument after the input directory is passed to the solver
+	args, params = parser.parse_known_args()
+
+	input_files = utils.get_files_with_extension(args.input_directory, 'in')
+	budget = args.budget * 3600 if args.budget is not None else None
+	schedule(input_files, args.output_directory, params, args.jobs, budget, args.state)
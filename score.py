@@ -949,8 +949,9 @@ dmg = [(0.0133333346336, '275_200'),
 (1.9058734439418532, '157_200')
 ]
 
-total = 0
-for x in dmg:
-	total += x[0]
+if __name__ == '__main__':
+	total = 0
+	for x in dmg:
+		total += x[0]
 
-print(total)
\ No newline at end of file
+	print(total)
\ No newline at end of file
@@ -3,8 +3,13 @@ import sys
 sys.path.append('..')
 sys.path.append('../..')
 import argparse
+import multiprocessing
 import utils
+from input_cache import read_input
+from results_store import get_store
+from run_log import flush_logs
 from solver_toolbox import *
+from portfolio import PortfolioSolver
 
 from student_utils import *
 """
@@ -15,23 +20,32 @@ from student_utils import *
 
 # Initialize solvers and modes
 ilp_solver = ILPSolver()
+ilp_assign_solver = ILPSolver(formulation="assign")
 brute_force_solver = BruteForceJSSolver()
+local_search_solver = LocalSearchSolver()
 naive_solver = NaiveSolver()
+portfolio_solver = PortfolioSolver({
+    "ilp": ilp_solver,
+    "ilp-assign": ilp_assign_solver,
+    "ls": local_search_solver,
+    "restarts": None,
+    "bf": brute_force_solver
+})
 
 solvers_mode = {
     "all": [ilp_solver, brute_force_solver],
     "bf": [brute_force_solver],
     "ilp": [ilp_solver],
-    "naive": [naive_solver]
+    "ilp-assign": [ilp_assign_solver],
+    "ls": [local_search_solver],
+    "naive": [naive_solver],
+    "portfolio": [portfolio_solver]
 }
 
 # One-time initialization of logfiles for this run
-for solver in solvers_mode["all"]:
-    timestamp = time.strftime("%d-%m-%y_%H-%M-%S")
-    solver.logfile = "logfiles/logfile_{}.txt".format(timestamp)
-
-# Init colorama
-init()
+timestamp = time.strftime("%d-%m-%y_%H-%M-%S")
+for solver in [ilp_solver, ilp_assign_solver, brute_force_solver, local_search_solver, naive_solver, portfolio_solver]:
+    solver.logfile = "logfiles/logfile_{}.jsonl".format(timestamp)
 
 def solve(list_of_locations, list_of_homes, starting_car_location, adjacency_matrix, input_file, params=[]):
     """
@@ -48,11 +62,7 @@ def solve(list_of_locations, list_of_homes, starting_car_location, adjacency_mat
     """
     best_solution = (float('inf'), [], {})
 
-    conn = sqlite3.connect('models.sqlite')
-    c = conn.cursor()
-
-    prev = c.execute('SELECT best_objective_bound FROM models WHERE input_file = (?)', (input_file,)).fetchone()
-    conn.close()
+    prev = get_store().best_objective(input_file)
 
     
     mode = "ilp"
@@ -65,7 +75,7 @@ def solve(list_of_locations, list_of_homes, starting_car_location, adjacency_mat
         if best_solution == None or solution[0] < best_solution[0]:
             best_solution = solution
 
-    return ("--force-write" in params or not prev or prev[0] > best_solution[0]), best_solution[1], best_solution[2]
+    return ("--force-write" in params or prev is None or prev > best_solution[0]), best_solution[1], best_solution[2]
 
 """
 ======================================================================
@@ -98,23 +108,19 @@ def convertToFile(path, dropoff_mapping, path_to_file, list_locs):
 def solve_from_file(input_file, output_directory, params=[]):
     print('\nProcessing', input_file)
 
-    conn = sqlite3.connect('models.sqlite')
-    c = conn.cursor()
-
     input_file_name = input_file.split('/')[-1]
 
-    optimal = c.execute('SELECT optimal FROM models WHERE input_file = (?)', (input_file_name,)).fetchone()
-    conn.close()
-
     # skip over optimal inputs
-    if optimal and optimal[0] and "--no-skip" not in params:
+    if get_store().is_optimal(input_file_name) and "--no-skip" not in params:
         print('SKIPPPING', input_file_name)
         return
 
-    input_data = utils.read_file(input_file)
-    num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = data_parser(input_data)
+    num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = read_input(input_file)
     improved, car_path, drop_offs = solve(list_locations, list_houses, starting_car_location, adjacency_matrix, input_file_name, params=params)
 
+    # the run log is written once per input
+    flush_logs()
+
     # only write out file if we got a better cost
     if not improved:
         print(input_file_name, 'DIDN\'T IMPROVE')
@@ -127,12 +133,37 @@ def solve_from_file(input_file, output_directory, params=[]):
     convertToFile(car_path, drop_offs, output_file, list_locations)
 
 
+def solve_worker(task):
+    i, num_files, input_file, output_directory, params = task
+    print (f"~~ Solving file {i + 1} of {num_files} ~~")
+    solve_from_file(input_file, output_directory, params=params)
+    return input_file
+
+
 def solve_all(input_directory, output_directory, params=[]):
     input_files = utils.get_files_with_extension(input_directory, 'in')
 
-    for i, input_file in enumerate(input_files):
-        print (f"~~ Solving file {i + 1} of {len(input_files)} ~~")
-        solve_from_file(input_file, output_directory, params=params)
+    jobs = 1
+    if "--jobs" in params:
+        jobs = int(params[params.index("--jobs") + 1])
+
+    if jobs <= 1:
+        for i, input_file in enumerate(input_files):
+            solve_worker((i, len(input_files), input_file, output_directory, params))
+        return
+
+    # pool workers can't start the portfolio's member processes
+    if "-m" in params and params[params.index("-m") + 1] == "portfolio":
+        raise ValueError('The portfolio runs its members in parallel itself, and can\'t be combined with --jobs')
+
+    # split the machine's cores between the workers so the MIPs don't oversubscribe the CPU
+    if "--threads" not in params:
+        params = params + ["--threads", str(max(1, multiprocessing.cpu_count() // jobs))]
+
+    tasks = [(i, len(input_files), input_file, output_directory, params) for i, input_file in enumerate(input_files)]
+    with multiprocessing.Pool(jobs, maxtasksperchild=1) as pool:
+        for input_file in pool.imap_unordered(solve_worker, tasks):
+            print("Finished", input_file)
 
 
 if __name__=="__main__":
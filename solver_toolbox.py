@@ -1,15 +1,29 @@
 from student_utils import *
-import itertools
-from itertools import product
+from distance_oracle import get_oracle
+from evaluator import get_evaluator
+from incidence import get_incidence
+from location_index import get_location_index
+from results_store import get_store
+from run_log import get_run_log
+from preprocess import GraphReduction
+from cuts import ConnectivityCutGenerator
+from lemma_cuts import lemmas_from_params, add_reverse_edge_cuts, add_walk_cuts, add_closest_dropoff_cuts, HEURISTIC_LEMMAS
+from assignment import DropoffAssignment
+from tour import tour_length, nearest_neighbour_tour, two_opt, improve_tour, expand_tour
+from tour_cache import get_tour_cache, EXACT_TOUR_VERTICES
 from sys import stdout as out
 from mip import Model, xsum, minimize, BINARY, INTEGER, OptimizationStatus
 import matplotlib.pyplot as plt
 import utils
 import time
-from colorama import init, Fore, Style
-import sqlite3
-import os
 import random
+import numpy as np
+
+# Relative slack on the stored bound and best cost the ILP's target and cutoff are taken from, so rounding never cuts off their solutions
+TARGET_TOLERANCE = 1e-6
+
+# Length of the ILP's first round when it only runs in rounds to check its target, doubling every round
+TARGET_ROUND_SECONDS = 30
 
 class BaseSolver:
 	""" Base class for solvers """
@@ -38,54 +52,22 @@ class BaseSolver:
 			home_indices: The list of home indices in the graph
 			car_path_indices: The indices of the vertices in G that are in the car path
 		Output:
-			MIP Model Starter, to be set as model.start
+			MIP Model Starter listing the nonzero variables, to be set as model.start
 		"""
+		edge_id = get_incidence(G).edge_id
+		oracle = get_oracle(G)
 
-		E = list(G.to_directed().edges())
-
-		x_starter = []
-		x_set = set()
-		prev = car_path_indices[0]
-		for curr in car_path_indices[1:]:
-			edge_index = E.index((prev, curr))
-			x_set.add(x[edge_index])
-			prev = curr
-
-		for x_i in x:
-			if x_i in x_set:
-				x_starter.append((x_i, 1.0))
-			else:
-				x_starter.append((x_i, 0.0))
+		car_edges = set(edge_id[(u, v)] for u, v in zip(car_path_indices, car_path_indices[1:]))
+		starter = [(x[i], 1.0) for i in sorted(car_edges)]
 
-		shortest_paths = dict(nx.all_pairs_shortest_path(G))
-		shortest_distances = dict(nx.floyd_warshall(G))
-		
-		t_starter = []
-		for i, home_index in enumerate(home_indices):
-			best_distance = float('inf')
-			best_path = []
-			for dropoff_vertex in car_path_indices:
-				distance = shortest_distances[dropoff_vertex][home_index]
-				path = shortest_paths[dropoff_vertex][home_index]
-
-				if distance < best_distance:
-					best_distance = distance
-					best_path = path
-			
-			prev = best_path[0]
-			t_set = set()
-			for curr in best_path[1:]:
-				edge_index = E.index((prev, curr))
-				t_set.add(t[i][edge_index])
-				prev = curr
-			
-			for x_i in t[i]:
-				if x_i in t_set:
-					t_starter.append((x_i, 1.0))
-				else:
-					t_starter.append((x_i, 0.0))
+		# each TA walks from the first car path vertex closest to their home, along the predecessor matrix's path
+		closest = np.argmin(oracle.dist[np.ix_(car_path_indices, home_indices)], axis=0)
+		for k, home_index in enumerate(home_indices):
+			walk = oracle.path(car_path_indices[closest[k]], home_index)
+			walk_edges = set(edge_id[(u, v)] for u, v in zip(walk, walk[1:]))
+			starter += [(t[k][i], 1.0) for i in sorted(walk_edges)]
 
-		return x_starter + t_starter
+		return starter
 
 	def generate_random(self, G, start_index):
 		"""
@@ -123,25 +105,9 @@ class BaseSolver:
 			NOTE: all outputs should be in terms of indices not the names of the locations themselves
 		"""
 
-		# Initialize shortest_distances matrix, where shortest_distances[r][c] is the shortest distance from r to c
-		shortest_distances = dict(nx.floyd_warshall(G))
-
-		# Determine TA dropoff
-		dropoffs = {}
-		total_cost = 0
-
-		for home in home_indices:
-
-			# Find preferred dropoff location for this TA
-			best_dropoff = None
-			for dropoff in car_path_indices:
-				if best_dropoff == None or shortest_distances[dropoff][home] < shortest_distances[best_dropoff][home]:
-					best_dropoff = dropoff
-
-			dropoffs[best_dropoff] = dropoffs.get(best_dropoff, []) + [home]
-			total_cost += shortest_distances[best_dropoff][home]
-		
-		return total_cost, dropoffs
+		# Each TA gets off at the first car path vertex closest to their home
+		assignment = DropoffAssignment(get_oracle(G).dist, home_indices, car_path_indices)
+		return assignment.cost, assignment.dropoffs()
 
 	def construct_path(self, start, edges, input_file):
 		"""
@@ -152,34 +118,56 @@ class BaseSolver:
 		Output:
 			List of edges in a path
 		"""
-		conn = sqlite3.connect('models.sqlite')
-		c = conn.cursor()
-
 		G = nx.DiGraph()
 		G.add_weighted_edges_from(edges)
 		path = [start]
 		if not edges:
-			self.log_update_entry(Fore.YELLOW + "No edges." + Style.RESET_ALL)
+			self.log_note("No edges.")
 		elif nx.is_eulerian(G):
 			path_edges = list(nx.eulerian_circuit(G, start))
 			path += [edge[1] for edge in path_edges]
 		else:
-			self.log_update_entry(Fore.YELLOW + "Graph was not Eulerian." + Style.RESET_ALL)
-			c.execute('UPDATE models SET optimal = 0 WHERE input_file = ?', (input_file,))
-			conn.commit()
-		conn.close()
+			self.log_note("Graph was not Eulerian.")
+			get_store().clear_optimal(input_file)
 		return path
 
-	logfile = "logfile_default.txt"
-	
-	def log_new_entry(self, input_file):
-		msg = "\n{}\t{}  \t".format(time.ctime(), input_file)
-		self.log_update_entry(msg)
+	def drives_edges_once(self, car_path):
+		""" Whether a closed walk drives along each directed edge at most once, as the ILP's binary edge variables require """
+		return len(set(zip(car_path, car_path[1:]))) == len(car_path) - 1
 
-	def log_update_entry(self, msg):
-		f = open(self.logfile, "a+")
-		f.write(msg + " ")
-		f.close()
+	def construct_tour(self, G, start, stops):
+		"""
+		Constructs the shortest closed walk we know of from the start through a set of vertices, exact for small sets
+		Input:
+			G: A NetworkX graph
+			start: starting vertex
+			stops: vertices the car must visit, in any order
+		Output:
+			List of vertices in the walk, following shortest paths between stops
+		"""
+		return get_tour_cache(G).walk(start, stops)
+
+	logfile = "logfiles/logfile_default.jsonl"
+	log_entry = None
+
+	def log_new_entry(self, input_file):
+		""" Start this solver's record for an input in the run log, written out once the input is finished """
+		self.log_entry = get_run_log(self.logfile).start(input_file, type(self).__name__)
+
+	def log_update_entry(self, **fields):
+		""" Set fields of the current record, e.g. status, objective, bound, gap """
+		if self.log_entry is not None:
+			self.log_entry.update(fields)
+
+	def log_phase(self, phase, seconds):
+		""" Record how long a phase of the current run took """
+		if self.log_entry is not None:
+			self.log_entry["phases"][phase] = round(seconds, 3)
+
+	def log_note(self, note):
+		""" Add a free-form remark to the current record """
+		if self.log_entry is not None:
+			self.log_entry["notes"].append(note)
 		
 def randomSolveJS(list_of_locations, list_of_homes, starting_car_location, adjacency_matrix, params=[]):
 	
@@ -201,30 +189,116 @@ class NaiveSolver(BaseSolver):
 			NOTE: all outputs should be in terms of indices not the names of the locations themselves
 		"""
 
-		conn = sqlite3.connect('models.sqlite')
-		c = conn.cursor()
-
-		prev = c.execute('SELECT best_objective_bound FROM models WHERE input_file = (?)', (input_file,)).fetchone()
+		self.log_new_entry(input_file)
 
-		path = convert_locations_to_indices([starting_car_location], list_of_locations)
-		homes = convert_locations_to_indices(list_of_homes, list_of_locations)
+		locations = get_location_index(list_of_locations)
+		path = [locations.index(starting_car_location)]
+		homes = locations.indices(list_of_homes)
 		dropoffs = {path[0]: homes}
 		G, message = adjacency_matrix_to_graph(adjacency_matrix)
-		cost, message = cost_of_solution(G, path, dropoffs)
+		cost, message = get_evaluator(G).cost_of_solution(path, dropoffs)
+		self.log_update_entry(status="heuristic", objective=cost)
 
-		if prev and prev[0] > cost:
-			print("UPDATING")
-			c.execute("UPDATE models SET best_objective_bound = ? WHERE input_file = ?", (cost, input_file))
-		else:
-			c.execute("INSERT INTO models (best_objective_bound, input_file, optimal) VALUES (?, ?, ?)", (input_file, cost, 0))
+		if get_store().record(input_file, cost, False):
+			print("UPDATING", input_file)
+			self.log_update_entry(updated=True)
 
-		conn.close()
 		return cost, path, dropoffs
 
-class BruteForceJSSolver(BaseSolver):
+class LocalSearchSolver(BaseSolver):
+	def __init__(self, swap_neighbours=10):
+		"""
+		Input:
+			swap_neighbours: How many of a dropoff's closest vertices are tried as its replacement in a swap move
+		"""
+		self.swap_neighbours = swap_neighbours
+
+	def local_search(self, G, home_indices, starting_car_index, initial_stops=None):
+		"""
+		Choose the set of vertices the car stops at by add/drop/swap moves, driving between them along
+		a nearest neighbour tour improved by 2-opt and Or-opt on the shortest path closure of G.
+		Input:
+			G: A NetworkX graph
+			home_indices: The indices of the vertices in G that are TA homes
+			starting_car_index: The index of the car's starting vertex
+			initial_stops: Stops to descend from, or None to descend from no stops and from every home
+		Output:
+			List of vertices representing the car path
+		"""
+		oracle = get_oracle(G)
+		D = oracle.dist
+		dist = D.tolist()
+
+		# closest vertices to each vertex, the only candidates for replacing it in a swap
+		neighbours = np.argsort(D, axis=1)[:, 1:self.swap_neighbours + 1].tolist()
+
+		def descend(stops):
+			tour = improve_tour(dist, nearest_neighbour_tour(dist, starting_car_index, stops))
+			assignment = DropoffAssignment(D, home_indices, tour[:-1])
+			to_homes = assignment.to_homes
+			best_cost = 2/3 * tour_length(dist, tour) + assignment.cost
+			while True:
+				length = tour_length(dist, tour)
+				members = tour[1:-1]
+				before, after = np.array(tour[:-1]), np.array(tour[1:])
+
+				# (cost, tour, added stop, dropped stop) of the best move of each kind,
+				# with new stops inserted at their cheapest position
+				moves = []
+
+				# add: insert v where it is cheapest, every TA walks from whichever stop is closer
+				insertion = D[before, :] + D[:, after].T - D[before, after][:, None]
+				add_cost = 2/3 * (length + insertion.min(axis=0)) + np.minimum(to_homes, assignment.nearest_dist).sum(axis=1)
+				add_cost[tour] = float('inf')
+				v = int(np.argmin(add_cost))
+				position = int(np.argmin(insertion[:, v])) + 1
+				moves.append((add_cost[v], tour[:position] + [v] + tour[position:], v, None))
+
+				for i, u in enumerate(members, start=1):
+					others = tour[:i] + tour[i + 1:]
+					others_nearest = assignment.nearest_without(u)
+					shortcut = dist[tour[i - 1]][tour[i + 1]] - dist[tour[i - 1]][u] - dist[u][tour[i + 1]]
+
+					# drop: the car skips u
+					moves.append((2/3 * (length + shortcut) + assignment.cost + assignment.delta_remove(u), others, None, u))
+
+					# swap: the car skips u and stops at one of u's neighbours instead
+					candidates = [w for w in neighbours[u] if w not in assignment.counts]
+					if not candidates:
+						continue
+					b, a = np.array(others[:-1]), np.array(others[1:])
+					swap_insertion = D[b][:, candidates] + D[candidates][:, a].T - D[b, a][:, None]
+					swap_cost = 2/3 * (length + shortcut + swap_insertion.min(axis=0)) \
+						+ np.minimum(to_homes[candidates], others_nearest).sum(axis=1)
+					j = int(np.argmin(swap_cost))
+					position = int(np.argmin(swap_insertion[:, j])) + 1
+					moves.append((swap_cost[j], others[:position] + [candidates[j]] + others[position:], candidates[j], u))
+
+				cost, new_tour, added, dropped = min(moves, key=lambda move: move[0])
+				if cost < best_cost - 1e-9:
+					if dropped is not None:
+						assignment.remove(dropped)
+					if added is not None:
+						assignment.add(added)
+					assignment.commit()
+				else:
+					# moves are polished with 2-opt only, the slower Or-opt runs once no move helps
+					new_tour = improve_tour(dist, tour)
+					if tour_length(dist, new_tour) >= length - 1e-9:
+						break
+				tour = two_opt(dist, new_tour)
+				best_cost = 2/3 * tour_length(dist, tour) + assignment.cost
+
+			return best_cost, tour
+
+		# descend from the empty tour, adding stops, and from a tour through every home, dropping them
+		starts = [[], home_indices] if initial_stops is None else [initial_stops]
+		best_cost, tour = min((descend(stops) for stops in starts), key=lambda result: result[0])
+		return expand_tour(oracle, tour)
+
 	def solve(self, list_of_locations, list_of_homes, starting_car_location, adjacency_matrix, input_file, params=[]):
 		"""
-		Solve the problem using brute force.
+		Solve the problem using local search over the set of dropoff vertices.
 		Input:
 			list_of_locations: A list of locations such that node i of the graph corresponds to name at index i of the list
 			list_of_homes: A list of homes
@@ -236,54 +310,119 @@ class BruteForceJSSolver(BaseSolver):
 			A dictionary mapping drop-off location to a list of homes of TAs that got off at that particular location
 			NOTE: all outputs should be in terms of indices not the names of the locations themselves
 		"""
-		home_indices = convert_locations_to_indices(list_of_homes, list_of_locations)
+		self.log_new_entry(input_file)
 
+		locations = get_location_index(list_of_locations)
+		home_indices = locations.indices(list_of_homes)
+		starting_car_index = locations.index(starting_car_location)
 		G, message = adjacency_matrix_to_graph(adjacency_matrix)
-		E = G.to_directed().edges(data='weight')
-
-		starting_car_index = list_of_locations.index(starting_car_location)
-		best_solution = (float('inf'), [], {})
-
-		def powerset(L):
-			for n in range(len(L) + 1):
-				yield from itertools.combinations(L, n)
-
-		counter = 0
-		for edge_set in powerset(E):
-			counter += 1
-			if (counter % 10000 == 0):
-				print(counter, end=" ")
-
-			# Check if edge set is valid
-			entry_counts = [0 for _ in list_of_locations]
-			exit_counts = [0 for _ in list_of_locations]
-			visited = set()
-			driving_cost = 0
-			contains_start = False
-			
-			for edge in edge_set:
-				visited.add(edge[1])
-				driving_cost += 2/3 * edge[2]
-				if (edge[0] == starting_car_index or edge[1] == starting_car_index):
-					contains_start = True
-
-			G_chosen = nx.DiGraph()
-			G_chosen.add_weighted_edges_from(edge_set)
-
-			if edge_set and nx.is_eulerian(G_chosen) and contains_start:
-				walking_cost, dropoffs = self.find_best_dropoffs(G, home_indices, list(visited))
-				total_cost = walking_cost + driving_cost
-
-				if total_cost < best_solution[0]:
-					best_solution = (total_cost, self.construct_path(starting_car_index, edge_set), dropoffs)
-		
-		print("\n\nBest cost was", best_solution[0])
-		return best_solution
 
-class ILPSolver(BaseSolver):
+		search_start = time.time()
+		car_path_indices = self.local_search(G, home_indices, starting_car_index)
+		search_time = time.time() - search_start
+
+		walk_cost, dropoffs = self.find_best_dropoffs(G, home_indices, car_path_indices)
+		cost, message = get_evaluator(G).cost_of_solution(car_path_indices, dropoffs)
+
+		print("Local search cost {} found in {:.2f}s".format(cost, search_time))
+		self.log_phase("search", search_time)
+		self.log_update_entry(status="heuristic", objective=cost)
+
+		store = get_store()
+		with store.transaction():
+			store.record_solution(input_file, car_path_indices, dropoffs, cost)
+			if store.record(input_file, cost, False):
+				print("UPDATING", input_file)
+				self.log_update_entry(updated=True)
+
+		return cost, car_path_indices, dropoffs
+
+class BruteForceJSSolver(BaseSolver):
+	def __init__(self, max_dropoffs=EXACT_TOUR_VERTICES):
+		"""
+		Input:
+			max_dropoffs: Largest number of dropoff vertices besides the start the search considers,
+				since every set must be toured exactly. Beyond it the result isn't proven optimal.
+		"""
+		self.max_dropoffs = max_dropoffs
+
+	def branch_and_bound(self, G, home_indices, starting_car_index, incumbent, deadline=None):
+		"""
+		Find the cheapest set of dropoff vertices. A set's cost is 2/3 of its shortest tour through the start
+		plus every TA walking from the closest vertex in the set or the start. Sets are enumerated in order of
+		their candidates, and a branch is pruned when a lower bound on the tour it needs plus every TA walking
+		from the closest vertex that could still join the set can't beat the best cost found.
+		Input:
+			G: A NetworkX graph
+			home_indices: The indices of the vertices in G that are TA homes
+			starting_car_index: The index of the car's starting vertex
+			incumbent: Cost of a known solution, only sets cheaper than it are returned
+			deadline: time.time() at which to stop searching, or None
+		Output:
+			Best cost, and the best set of dropoff vertices (None if nothing beat the incumbent)
+			Whether the search was exhaustive, proving the cost optimal
+		"""
+		dist = get_oracle(G).dist
+		start = starting_car_index
+		to_homes = dist[:, home_indices]
+		from_start = to_homes[start]
+
+		# a dropoff that is no TA's strictly closest stop can be skipped at no cost, so only vertices closer
+		# to some home than the start are candidates, the most promising first
+		savings = np.maximum(0.0, from_start[np.newaxis, :] - to_homes).sum(axis=1) - 4/3 * dist[start]
+		candidates = [int(v) for v in np.argsort(-savings, kind='stable') if v != start and (to_homes[v] < from_start).any()]
+
+		tours = get_tour_cache(G)
+		def car_cost(dropoffs):
+			return 2/3 * tours.length(start, dropoffs)
+
+		# Stack of (dropoffs, index of the next candidate, lower bound on the car's cost, distance walked by each TA).
+		# Adding v to a set lengthens its shortest tour by at least ins(v) = min d(a, v) + d(v, b) - d(a, b) over a, b
+		# already in it, and adding several vertices by at least the largest of theirs. So a branch adding v and then
+		# vertices with ins at most t costs at least 2/3 (tour + max(ins(v), t)) plus every TA walking from the closest
+		# of those vertices, and tours are only computed exactly for sets whose bound could still beat the best cost.
+		best = {"cost": incumbent, "set": None}
+		complete = True
+		stack = [([], 0, 0.0, from_start)]
+		while stack:
+			if deadline is not None and time.time() > deadline:
+				return best["cost"], best["set"], False
+
+			dropoffs, i, car, walks = stack.pop()
+			if car + walks.sum() < best["cost"] - 1e-9:
+				car = car_cost(dropoffs)
+				if car + walks.sum() < best["cost"] - 1e-9:
+					best["cost"], best["set"] = car + walks.sum(), dropoffs
+
+			rest = candidates[i:]
+			if not rest:
+				continue
+			if len(dropoffs) == self.max_dropoffs:
+				complete = False
+				continue
+
+			stops = [start] + dropoffs
+			insertion = (dist[stops][:, rest][:, np.newaxis, :] + dist[stops][:, rest][np.newaxis, :, :]
+				- dist[np.ix_(stops, stops)][:, :, np.newaxis]).min(axis=(0, 1))
+			child_walks = np.minimum(walks[np.newaxis, :], to_homes[rest])
+
+			# bound[r, t]: child r, then later candidates with insertion cost up to that of the t-th cheapest to insert
+			order = np.argsort(insertion, kind='stable')
+			later = order[np.newaxis, :] > np.arange(len(rest))[:, np.newaxis]
+			closest = np.minimum.accumulate(np.where(later[:, :, np.newaxis], to_homes[rest][order][np.newaxis, :, :], np.inf), axis=1)
+			bound = 2/3 * (car + np.maximum(insertion[:, np.newaxis], insertion[order][np.newaxis, :])) \
+				+ np.minimum(child_walks[:, np.newaxis, :], closest).sum(axis=2)
+			bound = np.minimum(bound.min(axis=1), 2/3 * (car + insertion) + child_walks.sum(axis=1))
+
+			# depth first, the most promising child on top
+			for r in np.flatnonzero(bound < best["cost"] - 1e-9)[::-1]:
+				stack.append((dropoffs + [rest[r]], i + r + 1, car + 2/3 * insertion[r], child_walks[r]))
+
+		return best["cost"], best["set"], complete
+
 	def solve(self, list_of_locations, list_of_homes, starting_car_location, adjacency_matrix, input_file, params=[]):
 		"""
-		Solve the problem using an MST/DFS approach.
+		Solve the problem exactly by branch and bound over sets of dropoff vertices, starting from the local search solution.
 		Input:
 			list_of_locations: A list of locations such that node i of the graph corresponds to name at index i of the list
 			list_of_homes: A list of homes
@@ -295,89 +434,204 @@ class ILPSolver(BaseSolver):
 			A dictionary mapping drop-off location to a list of homes of TAs that got off at that particular location
 			NOTE: all outputs should be in terms of indices not the names of the locations themselves
 		"""
-		conn = sqlite3.connect('models.sqlite')
-		c = conn.cursor()
-		seen = c.execute('SELECT best_objective_bound FROM models WHERE input_file = (?)', (input_file,)).fetchone()
-		
 		self.log_new_entry(input_file)
 
-		home_indices = convert_locations_to_indices(list_of_homes, list_of_locations)
-		location_indices = convert_locations_to_indices(list_of_locations, list_of_locations)
+		locations = get_location_index(list_of_locations)
+		home_indices = locations.indices(list_of_homes)
+		starting_car_index = locations.index(starting_car_location)
+		G, message = adjacency_matrix_to_graph(adjacency_matrix)
+		evaluator = get_evaluator(G)
 
-		edge_scale = 1.0
-		if "--approx" in params:
-			edge_scale = 1/10000
+		timeout = 300
+		if "-t" in params:
+			timeout = int(params[params.index("-t") + 1])
+		deadline = time.time() + timeout if timeout != -1 else None
+
+		car_path_indices = LocalSearchSolver().local_search(G, home_indices, starting_car_index)
+		walk_cost, dropoffs = self.find_best_dropoffs(G, home_indices, car_path_indices)
+		cost, message = evaluator.cost_of_solution(car_path_indices, dropoffs)
+
+		search_start = time.time()
+		best_cost, stops, optimal = self.branch_and_bound(G, home_indices, starting_car_index, cost, deadline)
+		search_time = time.time() - search_start
+		self.log_phase("search", search_time)
+
+		if stops is not None:
+			car_path_indices = self.construct_tour(G, starting_car_index, stops)
+			walk_cost, dropoffs = self.find_best_dropoffs(G, home_indices, car_path_indices)
+			cost, message = evaluator.cost_of_solution(car_path_indices, dropoffs)
+
+		print("Branch and bound {} cost {} in {:.2f}s".format("proved optimal" if optimal else "found", cost, search_time))
+		self.log_update_entry(status="optimal" if optimal else "heuristic", objective=cost)
+
+		store = get_store()
+		with store.transaction():
+			# as an oracle for the other solvers, a proven optimum must agree with every stored result
+			stored = store.get(input_file)
+			if optimal and stored is not None and stored[0] < cost * (1 - 1e-9):
+				print("DANGER: stored cost {} of {} is below the proven optimum {}".format(stored[0], input_file, cost))
+				self.log_note("stored cost {} below proven optimum".format(stored[0]))
+			elif optimal and stored is not None and stored[1] and stored[0] > cost * (1 + 1e-9):
+				print("DANGER: stored optimal cost {} of {} is above the proven optimum {}".format(stored[0], input_file, cost))
+				self.log_note("stored optimal cost {} above proven optimum".format(stored[0]))
+
+			store.record_solution(input_file, car_path_indices, dropoffs, cost, cost if optimal else None)
+			if optimal:
+				store.record_bound(input_file, "branch-and-bound", cost)
+			if store.record(input_file, cost, optimal):
+				print("UPDATING", input_file)
+				self.log_update_entry(updated=True)
+
+		return cost, car_path_indices, dropoffs
 
-		G, message = adjacency_matrix_to_graph(adjacency_matrix, edge_scale)
-		E = list(G.to_directed().edges(data='weight'))
+class ILPSolver(BaseSolver):
+	def __init__(self, formulation="flow", lazy_cuts=False, preprocess=False, lemmas=()):
+		"""
+		Input:
+			formulation: "flow" routes every TA along directed edges with its own flow variables,
+				"assign" assigns every TA to a car-visited dropoff using precomputed shortest distances
+			lazy_cuts: If true, always enforce car tour connectivity with lazy cuts (also enabled by --lazy-cuts)
+			preprocess: If true, always build the model on the reduced graph of preprocess.GraphReduction
+				(also enabled by --preprocess)
+			lemmas: Families of lemma_cuts.LEMMA_FLAGS always added to the model (each also enabled by its flag)
+		"""
+		self.formulation = formulation
+		self.lazy_cuts = lazy_cuts
+		self.preprocess = preprocess
+		self.lemmas = lemmas
 
-		starting_car_index = list_of_locations.index(starting_car_location)
+		# portfolio.SharedIncumbent of the solvers racing this one, set by the portfolio in its process
+		self.incumbent = None
 
-		start_paths = [convert_locations_to_indices([starting_car_location], list_of_locations)]
-		num_random_paths = 5
-		if "-r" in params:
-			num_random_paths = int(params[params.index("-r") + 1])
+	def model_size(self, num_vertices, num_edges, num_homes, lazy_cuts=False):
+		"""
+		Number of variables and constraints build_model creates, without building it.
+		Input:
+			num_vertices: Number of vertices of the graph
+			num_edges: Number of directed edges of the graph
+			num_homes: Number of TAs
+			lazy_cuts: Whether the car flow is replaced by lazy cuts
+		Output:
+			Number of columns
+			Number of rows
+		"""
+		n, m, h = num_vertices, num_edges, num_homes
+		if lazy_cuts:
+			cols, rows = m, n
+		else:
+			cols, rows = 2 * m + n + 1, 2 * m + 4 * n + 3
+		if self.formulation == "assign":
+			return cols + n + h * n, rows + n + h + h * n
+		return cols + h * (2 * m + n), rows + h * (m + 2 * n + 1)
 
-		for i in range(num_random_paths):
-			start_paths.append(self.generate_random(G, starting_car_index))
+	def build_model(self, G, home_indices, starting_car_index, lazy_cuts=False, lemmas=()):
+		"""
+		Build the MIP for the given graph using this solver's formulation. Every constraint is
+		emitted from the precomputed in/out edge lists, so construction is linear in the number of nonzeros.
+		Input:
+			G: A NetworkX graph
+			home_indices: The indices of the vertices in G that are TA homes
+			starting_car_index: The index of the car's starting vertex
+			lazy_cuts: If true, replace the car flow with lazily separated connectivity cuts
+			lemmas: Names of the lemma_cuts families to add
+		Output:
+			The MIP model
+			A dictionary mapping variable group names to their variable lists
+		"""
+		model = Model()
 
-		if seen:
-			output_file = 'submissions/submission_final/{}.out'.format(input_file.split('.')[0])
-			print(output_file)
-			if not "--no-prev" in params and os.path.isfile(output_file):
-				start_paths.append(convert_locations_to_indices(utils.read_file(output_file)[0], list_of_locations))
-		
-		best_start_path_cost = float('inf')
-		best_start_path_index = -1
-		for i, path in enumerate(start_paths):
-			walk_cost, dropoffs = self.find_best_dropoffs(G, home_indices, path)
-			cost, msg = cost_of_solution(G, path, dropoffs)
+		if self.formulation == "assign":
+			variables = self.build_assign_model(model, G, home_indices, starting_car_index, lazy_cuts)
+		else:
+			variables = self.build_flow_model(model, G, home_indices, starting_car_index, lazy_cuts)
 
-			if cost < best_start_path_cost:
-				best_start_path_cost = cost
-				best_start_path_index = i
+		if lemmas:
+			self.add_lemma_cuts(model, variables, G, home_indices, starting_car_index, lemmas)
 
-		start_path = start_paths[best_start_path_index]
-		print("Starting path:")
-		if best_start_path_index == num_random_paths:
-			print("SAVED PATH:", start_path)
-		elif best_start_path_index >= 0:
-			print("RANDOM PATH:", start_path)
+		# WINNING ONLINE
+		model.max_gap = 0.00001
+		model.emphasis = 2
+		model.symmetry = 2
+
+		return model, variables
+
+	def add_lemma_cuts(self, model, variables, G, home_indices, starting_car_index, lemmas):
+		"""
+		Add the lemma_cuts families to a built model, printing how many constraints each one added.
+		Input:
+			model: The MIP model
+			variables: The dictionary of variable lists returned by the formulation
+			G: A NetworkX graph
+			home_indices: The indices of the vertices in G that are TA homes
+			starting_car_index: The index of the car's starting vertex
+			lemmas: Names of the lemma_cuts families to add
+		"""
+		inc = get_incidence(G)
+		x = variables["x"]
+
+		# the vertex each TA gets off at: a in the assignment formulation, the flow out of the source in the flow formulation
+		if self.formulation == "assign":
+			drops = variables["a"]
 		else:
-			print("No start path found")
-		print("Starting cost:", best_start_path_cost)
+			drops = [f_k[len(inc.E):] for f_k in variables["f_t"]]
+
+		if "reverse" in lemmas:
+			print("Reverse edge lemma: {} constraints".format(add_reverse_edge_cuts(model, x, inc)))
+		if "walk" in lemmas:
+			if "t" in variables:
+				print("TA walk lemma: {} constraints".format(add_walk_cuts(model, x, variables["t"], inc)))
+			else:
+				print("TA walk lemma skipped: the {} formulation has no TA edge variables".format(self.formulation))
+		if "closest" in lemmas:
+			count, fixed = add_closest_dropoff_cuts(model, x, drops, inc, get_oracle(G).dist, home_indices, starting_car_index)
+			print("Closest dropoff lemma: {} constraints, {} dropoffs fixed to zero".format(count, fixed))
+
+	def add_car_tour(self, model, G, starting_car_index, lazy_cuts=False):
+		"""
+		Add the car's variables and the constraints making its chosen edges a closed walk through the start.
+		Input:
+			model: The MIP model
+			G: A NetworkX graph
+			starting_car_index: The index of the car's starting vertex
+			lazy_cuts: If true, connectivity is enforced by separating cuts instead of by car flow, see optimize_connected
+		Output:
+			Car edge variables x and car flow variables f (empty with lazy cuts)
+		"""
+		inc = get_incidence(G)
+		E, in_edges, out_edges = inc.E, inc.in_edges, inc.out_edges
 
 		# number of nodes and list of vertices, not including source or sink
-		n, V, H = len(list_of_locations), location_indices, home_indices 
+		n, V = inc.n, range(inc.n)
 		bigNum = (2 * n) 
 
-		model = Model()
-
 		# does the car drive from i to j?
-		x = [model.add_var(var_type=BINARY) for e in E]
+		x = [model.add_var(name="x({})".format(i), var_type=BINARY) for i in range(len(E))]
 
-		# does the kth TA walk from i to j? over all num_homes TAs
-		t = [[model.add_var(var_type=BINARY) for e in E] for k in H]
+		if lazy_cuts:
+			# For each vertex v, Sum{x_(u, v)} = Sum{x_(v, w)}
+			for v in V:
+				model += xsum(x[i] for i in in_edges[v]) == xsum(x[i] for i in out_edges[v])
+
+			# only fractional solutions are cut during the search, optimize_connected rejects disconnected tours
+			model.cuts_generator = ConnectivityCutGenerator(x, inc, starting_car_index)
+			return x, []
 
 		# car flow from vertex u to vertex v
 		f = [model.add_var(var_type=INTEGER) for e in E] \
 		+ [model.add_var(var_type=INTEGER) for v in V] \
 		+ [model.add_var(var_type=INTEGER)]
 
-		# kth TA flow from vertex u to vertex v
-		f_t = [[model.add_var(var_type=BINARY) for e in E] + [model.add_var(var_type=BINARY) for v in V] for k in H]
-
 		for i in range(len(f)):
 			model += f[i] >= 0
 
 		# For each vertex v where v != source and v != sink, Sum{x_(u, v)} = Sum{x_(v, w)}
 		for v in V:
-			model += xsum([x[i] for i in range(len(E)) if E[i][1] == v]) == xsum([x[i] for i in range(len(E)) if E[i][0] == v])
+			model += xsum(x[i] for i in in_edges[v]) == xsum(x[i] for i in out_edges[v])
 
 		# For each vertex v where v != sink, Sum{f_(u, v)} = Sum{f_(v, w)}
-		for j in range(len(V)):
-			model += xsum([f[i] for i in range(len(E)) if E[i][1] == V[j]]) + (f[-1] if V[j] == starting_car_index else 0) \
-				 == xsum([f[i] for i in range(len(E)) if E[i][0] == V[j]]) + f[len(E) + j]
+		for v in V:
+			model += xsum(f[i] for i in in_edges[v]) + (f[-1] if v == starting_car_index else 0) \
+				 == xsum(f[i] for i in out_edges[v]) + f[len(E) + v]
 
 		# For each edge (u, v) where u != source and v != sink, f_(u, v) <= (big number) * x_(u, v)
 		for i in range(len(E)):
@@ -387,13 +641,38 @@ class ILPSolver(BaseSolver):
 		model += f[-1] <= bigNum
 
 		# For each edge (u, sink), f_(u, sink) <= Sum{x_(w, u)}
-		for j in range(len(V)):
-			model += f[j + len(E)] \
-				 <= xsum([x[i] for i in range(len(E)) if E[i][1] == V[j]])
+		for v in V:
+			model += f[len(E) + v] <= xsum(x[i] for i in in_edges[v])
 
 		# For just the source vertex, f_(source,start vertex)} = Sum{x_(a, b)}
 		model += f[-1] == xsum(x)
 
+		return x, f
+
+	def build_flow_model(self, model, G, home_indices, starting_car_index, lazy_cuts=False):
+		"""
+		Flow formulation: every TA walks home along directed edges, with a unit flow per TA.
+		Input:
+			model: The MIP model
+			G: A NetworkX graph
+			home_indices: The indices of the vertices in G that are TA homes
+			starting_car_index: The index of the car's starting vertex
+			lazy_cuts: If true, replace the car flow with lazily separated connectivity cuts
+		Output:
+			Dictionary with the variable lists x, t, f, f_t
+		"""
+		inc = get_incidence(G)
+		E, in_edges, out_edges = inc.E, inc.in_edges, inc.out_edges
+		V, H = range(inc.n), home_indices
+
+		x, f = self.add_car_tour(model, G, starting_car_index, lazy_cuts)
+
+		# does the kth TA walk from i to j? over all num_homes TAs
+		t = [[model.add_var(var_type=BINARY) for e in E] for k in H]
+
+		# kth TA flow from vertex u to vertex v
+		f_t = [[model.add_var(var_type=BINARY) for e in E] + [model.add_var(var_type=BINARY) for v in V] for k in H]
+
 		# For every TA for every edge, can't flow unless edge is walked along
 		for i in range(len(t)):
 			for j in range(len(E)):
@@ -401,67 +680,425 @@ class ILPSolver(BaseSolver):
 
 		# For every TA for every non-home vertex, flow in equals flow out
 		for i in range(len(H)):
-			for j in range(len(V)):
-				if V[j] != H[i]:
-					model += xsum(f_t[i][k] for k in range(len(E)) if E[k][1] == V[j]) + f_t[i][len(E) + j] \
-						== xsum(f_t[i][k] for k in range(len(E)) if E[k][0] == V[j])
+			for v in V:
+				if v != H[i]:
+					model += xsum(f_t[i][k] for k in in_edges[v]) + f_t[i][len(E) + v] \
+						== xsum(f_t[i][k] for k in out_edges[v])
 
 		# For every TA, flow out of the source vertex is exactly 1
 		for k in f_t:
-			model += xsum(k[len(E) + i] for i in range(len(V))) == 1
+			model += xsum(k[len(E) + v] for v in V) == 1
 
 		# For every TA for every edge out of source, can't flow unless car visits vertex
 		for k in f_t:
-			for i in range(len(V)):
-				model += k[len(E) + i] <= xsum(x[j] for j in range(len(E)) if E[j][1] == V[i])
+			for v in V:
+				model += k[len(E) + v] <= xsum(x[j] for j in in_edges[v])
 
 		# For every TA, flow into the home vertex is exactly 1
 		for i in range(len(H)):
-			model += xsum(f_t[i][j] for j in range(len(E)) if E[j][1] == H[i]) + f_t[i][len(E) + H[i]] == 1
+			model += xsum(f_t[i][j] for j in in_edges[H[i]]) + f_t[i][len(E) + H[i]] == 1
 
 		# objective function: minimize the distance
-		model.objective = minimize(2.0/3.0 * xsum([x[i] * E[i][2] for i in range(len(E))]) \
-			+ xsum([xsum([t[i][j] * E[j][2] for j in range(len(E))]) for i in range(len(t))]))
+		model.objective = minimize(2.0/3.0 * xsum(x[i] * E[i][2] for i in range(len(E))) \
+			+ xsum(t[i][j] * E[j][2] for i in range(len(t)) for j in range(len(E))))
 
-		# WINNING ONLINE
-		model.max_gap = 0.00001
-		model.emphasis = 2
-		model.symmetry = 2
+		return {"x": x, "t": t, "f": f, "f_t": f_t}
+
+	def build_assign_model(self, model, G, home_indices, starting_car_index, lazy_cuts=False):
+		"""
+		Assignment formulation: TAs walk along shortest paths, so each TA is simply assigned
+		to one car-visited vertex and pays the precomputed distance from there to their home.
+		Input:
+			model: The MIP model
+			G: A NetworkX graph
+			home_indices: The indices of the vertices in G that are TA homes
+			starting_car_index: The index of the car's starting vertex
+			lazy_cuts: If true, replace the car flow with lazily separated connectivity cuts
+		Output:
+			Dictionary with the variable lists x, f, y, a
+		"""
+		inc = get_incidence(G)
+		E, in_edges = inc.E, inc.in_edges
+		V, H = range(inc.n), home_indices
+		dist = get_oracle(G).dist
+
+		x, f = self.add_car_tour(model, G, starting_car_index, lazy_cuts)
+
+		# does the car visit vertex v?
+		y = [model.add_var(var_type=BINARY) for v in V]
+
+		# is the kth TA dropped off at vertex v?
+		a = [[model.add_var(var_type=BINARY) for v in V] for k in H]
+
+		# The car is always at the start, and visits any other vertex only if it drives into it
+		for v in V:
+			if v == starting_car_index:
+				model += y[v] == 1
+			else:
+				model += y[v] <= xsum(x[i] for i in in_edges[v])
+
+		# For every TA, exactly one dropoff vertex
+		for k in a:
+			model += xsum(k) == 1
+
+		# For every TA, can't get off unless the car visits the vertex
+		for k in a:
+			for v in V:
+				model += k[v] <= y[v]
+
+		# objective function: minimize driving plus shortest-path walking distance
+		model.objective = minimize(2.0/3.0 * xsum(x[i] * E[i][2] for i in range(len(E))) \
+			+ xsum(float(dist[v][H[k]]) * a[k][v] for k in range(len(H)) for v in V))
+
+		return {"x": x, "f": f, "y": y, "a": a}
+
+	def construct_assign_starter(self, x, y, a, G, home_indices, car_path_indices):
+		"""
+		Treating the car's cycle as constant, find a valid solution to the assignment ILP.
+		Input:
+			x, y, a: Variable lists of the assignment formulation
+			G: A NetworkX graph
+			home_indices: The list of home indices in the graph
+			car_path_indices: The indices of the vertices in G that are in the car path
+		Output:
+			MIP Model Starter listing the nonzero variables, to be set as model.start
+		"""
+		edge_id = get_incidence(G).edge_id
+		starter = [(x[edge_id[(u, v)]], 1.0) for u, v in zip(car_path_indices, car_path_indices[1:])]
+		starter += [(y[v], 1.0) for v in set(car_path_indices)]
+
+		walk_cost, dropoffs = self.find_best_dropoffs(G, home_indices, car_path_indices)
+		position = {home: k for k, home in enumerate(home_indices)}
+		for dropoff, homes in dropoffs.items():
+			starter += [(a[position[home]][dropoff], 1.0) for home in homes]
+		return starter
+
+	def set_targets(self, model, input_file, edge_scale, params):
+		"""
+		Opt-in limits from the stored results. With --target the search stops once its incumbent reaches the best
+		stored lower bound, which proves it optimal; the bound is never added to the model, since a wrong bound
+		would then cut off the optimum. With --cutoff every node that can't beat the stored best cost is pruned,
+		so the search finds nothing at all if the stored cost is already optimal.
+		Input:
+			model: The MIP model
+			input_file: The input's file name
+			edge_scale: The factor edge weights were scaled by
+			params: Extra arguments passed to the solver
+		Output:
+			The target and the cutoff, in unscaled units, or None for either one not set
+		"""
+		store = get_store()
+
+		# stored optimal flags are not trusted as bounds, only the recorded bounds are
+		target = None
+		if "--target" in params:
+			target = store.bound(input_file)
+
+		cutoff = None
+		objective = (store.get(input_file) or (None, False))[0]
+		if objective is not None and "--cutoff" in params:
+			cutoff = objective * (1 + TARGET_TOLERANCE)
+			model.cutoff = cutoff * edge_scale
+
+		return target, cutoff
+
+	def optimize_in_rounds(self, model, variables, G, home_indices, reduction, timeout, stall=None, edge_scale=1.0, target=None):
+		"""
+		Optimize in rounds, restarting each round from the better of the model's incumbent and the portfolio's
+		shared one, so tours found by racing heuristics are injected into the search. CBC can't be stopped or
+		given a solution mid-search, so this is also how a stalled search is stopped, or one that reached its target.
+		Every round restarts CBC from scratch with only the incumbent as its start: the search tree, cuts and bound
+		of the previous round are lost. With a stall limit every round lasts that long, and once there is an
+		incumbent, the first round that doesn't improve it ends the search. Without one, rounds start at the
+		portfolio's round length (or TARGET_ROUND_SECONDS) and double.
+		Input:
+			model: The MIP model
+			variables: The dictionary of variable lists returned by the formulation
+			G: The graph the model is built on
+			home_indices: The indices of the vertices in G that are TA homes
+			reduction: The GraphReduction G comes from, or None
+			timeout: Seconds to optimize for, or -1 for no limit
+			stall: Seconds the search may go without improving its incumbent, or None for no limit
+			edge_scale: The factor edge weights were scaled by
+			target: Lower bound, in unscaled units, an incumbent reaching it is optimal, or None
+		Output:
+			Status of the last round, OPTIMAL if the incumbent reached the target
+		"""
+		deadline = time.time() + timeout if timeout != -1 else None
+		if stall is not None:
+			round_seconds = stall
+		elif self.incumbent is not None:
+			round_seconds = self.incumbent.round_seconds
+		else:
+			round_seconds = TARGET_ROUND_SECONDS
+		best = float('inf')
+		while True:
+			seconds = round_seconds if deadline is None else max(1, min(round_seconds, deadline - time.time()))
+			status = model.optimize(max_seconds=seconds)
+			if status not in (OptimizationStatus.FEASIBLE, OptimizationStatus.NO_SOLUTION_FOUND):
+				return status
+
+			objective = model.objective_value if model.num_solutions > 0 else float('inf')
+			if target is not None and objective <= target * (1 + TARGET_TOLERANCE) * edge_scale:
+				print("Reached the stored lower bound {}, stopping".format(target))
+				self.log_note("reached target")
+				return OptimizationStatus.OPTIMAL
+			if deadline is not None and time.time() >= deadline:
+				return status
+
+			if stall is not None:
+				if model.num_solutions > 0 and objective >= best - 1e-9:
+					print("No better solution in {}s, stopping".format(stall))
+					self.log_note("stalled")
+					return status
+			else:
+				round_seconds *= 2
+			best = objective
+
+			# the shared tour is on the input graph, and only a valid starter if it drives along each directed edge at most once
+			cost, car_path = self.incumbent.get() if self.incumbent is not None else (float('inf'), None)
+			if car_path is not None and cost * edge_scale < objective - 1e-9:
+				if reduction is not None:
+					car_path = reduction.reduce_path(car_path)
+				if self.drives_edges_once(car_path):
+					print("Restarting from the shared tour of cost", cost)
+					if self.formulation == "assign":
+						model.start = self.construct_assign_starter(variables["x"], variables["y"], variables["a"], G, home_indices, car_path)
+					else:
+						model.start = self.construct_starter(variables["x"], variables["t"], G, home_indices, car_path)
+					continue
+			if model.num_solutions > 0:
+				model.start = [(var, var.x) for var in model.vars if abs(var.x) > 1e-6]
+
+	def optimize_connected(self, model, x, G, starting_car_index, timeout):
+		"""
+		Optimize a model whose car tour is kept connected by cuts instead of car flow. CBC doesn't keep lazy
+		constraints, and once they are set it drops every solution, the warm start included, so only fractional
+		solutions are cut during the search. Instead the model is optimized until its incumbent is a connected
+		tour, adding the constraints a disconnected incumbent violates and restarting CBC from the warm start
+		after every solve. If time runs out on a disconnected incumbent, the car is fixed to the warm start's
+		tour (or to the start if there is none) and only the dropoffs are optimized.
+		Input:
+			model: The MIP model, built with lazy_cuts
+			x: Car edge variables
+			G: The graph the model is built on
+			starting_car_index: The index of the car's starting vertex in G
+			timeout: Seconds to optimize for, or -1 for no limit
+		Output:
+			Status of the search, and the lower bound it proved, or None
+		"""
+		deadline = time.time() + timeout if timeout != -1 else None
+		start = model.start
+		separator = ConnectivityCutGenerator(x, get_incidence(G), starting_car_index, lazy=True)
+
+		# every solve's bound stays valid, since constraints are only ever added
+		bound = None
+		while True:
+			status = model.optimize() if deadline is None else model.optimize(max_seconds=max(1, deadline - time.time()))
+			if model.objective_bound is not None:
+				bound = model.objective_bound if bound is None else max(bound, model.objective_bound)
+			if model.num_solutions == 0:
+				return status, bound
+
+			num_cuts = separator.add_tour_constrs(model)
+			if num_cuts == 0:
+				return status, bound
+			print("Incumbent tour is disconnected, added {} connectivity constraints".format(num_cuts))
+			if deadline is not None and time.time() >= deadline:
+				break
+			if start is not None:
+				model.start = start
+
+		# the disconnected incumbent is no solution, but any dropoffs from the warm start's tour are
+		fixed = {var.idx: value for var, value in start or []}
+		for var in x:
+			var.lb = var.ub = round(fixed.get(var.idx, 0.0))
+		model.optimize()
+		print("Out of time on a disconnected tour, the car drives the warm start's tour")
+		return OptimizationStatus.FEASIBLE if model.num_solutions > 0 else OptimizationStatus.NO_SOLUTION_FOUND, bound
+
+	def solve(self, list_of_locations, list_of_homes, starting_car_location, adjacency_matrix, input_file, params=[]):
+		"""
+		Solve the problem using an MST/DFS approach.
+		Input:
+			list_of_locations: A list of locations such that node i of the graph corresponds to name at index i of the list
+			list_of_homes: A list of homes
+			starting_car_location: The name of the starting location for the car
+			adjacency_matrix: The adjacency matrix from the input file
+		Output:
+			A cost of how expensive the current solution is
+			A list of locations representing the car path
+			A dictionary mapping drop-off location to a list of homes of TAs that got off at that particular location
+			NOTE: all outputs should be in terms of indices not the names of the locations themselves
+		"""
+		store = get_store()
+		seen = store.get(input_file)
+		
+		self.log_new_entry(input_file)
+
+		locations = get_location_index(list_of_locations)
+		home_indices = locations.indices(list_of_homes)
+
+		edge_scale = 1.0
+		if "--approx" in params:
+			edge_scale = 1/10000
+
+		G, message = adjacency_matrix_to_graph(adjacency_matrix, edge_scale)
+		starting_car_index = locations.index(starting_car_location)
+		lazy_cuts = self.lazy_cuts or "--lazy-cuts" in params
+		lemmas = lemmas_from_params(self.lemmas, params)
+
+		# with a heuristic lemma the model may have lost every optimal solution, so its results prove nothing
+		exact = not HEURISTIC_LEMMAS.intersection(lemmas)
+
+		# the model is built on model_G, which is G itself or its reduction
+		model_G, model_homes, model_start, reduction = G, home_indices, starting_car_index, None
+		if self.preprocess or "--preprocess" in params:
+			reduction = GraphReduction(G, home_indices, starting_car_index)
+			model_G, model_homes, model_start = reduction.G, reduction.home_indices, reduction.starting_car_index
+
+			report = reduction.report()
+			before = self.model_size(report["vertices"][0], report["edges"][0], len(home_indices), lazy_cuts)
+			after = self.model_size(report["vertices"][1], report["edges"][1], len(home_indices), lazy_cuts)
+			print("Preprocessing removed {} and contracted {} vertices, fixed {} car edges: {} -> {} variables, {} -> {} constraints".format(
+				report["removed"], report["contracted"], report["fixed"], before[0], after[0], before[1], after[1]))
+			self.log_update_entry(reduction=dict(report, cols=[before[0], after[0]], rows=[before[1], after[1]]))
+		E = get_incidence(model_G).E
+
+		start_paths = [[starting_car_index]]
+		start_labels = ["START ONLY PATH"]
+		num_random_paths = 5
+		if "-r" in params:
+			num_random_paths = int(params[params.index("-r") + 1])
+
+		for i in range(num_random_paths):
+			start_paths.append(self.generate_random(G, starting_car_index))
+			start_labels.append("RANDOM PATH")
+
+		if "--no-ls-start" not in params:
+			start_paths.append(LocalSearchSolver().local_search(G, home_indices, starting_car_index))
+			start_labels.append("LOCAL SEARCH PATH")
+
+		# the best distinct tours stored by earlier runs
+		if "--no-prev" not in params:
+			for rank, solution in enumerate(store.solutions(input_file)):
+				start_paths.append(solution.car_path)
+				start_labels.append("SAVED PATH #{}".format(rank + 1))
+
+		# the best tour the solvers racing this one have shared so far
+		if self.incumbent is not None:
+			cost, car_path = self.incumbent.get()
+			if car_path is not None:
+				start_paths.append(car_path)
+				start_labels.append("SHARED PATH")
+
+		# starters are found on the input graph and run on the reduced one
+		if reduction is not None:
+			start_paths = [reduction.reduce_path(path) for path in start_paths]
+
+		# a tour is only a valid starter if it drives along each directed edge at most once, CBC silently drops any other
+		valid = [i for i, path in enumerate(start_paths) if self.drives_edges_once(path)]
+		start_paths, start_labels = [start_paths[i] for i in valid], [start_labels[i] for i in valid]
+
+		start_path_costs = get_evaluator(model_G).score_batch(start_paths, model_homes)
+		best_start_path_index = int(np.argmin(start_path_costs))
+		best_start_path_cost = float(start_path_costs[best_start_path_index])
+		if best_start_path_cost == float('inf'):
+			best_start_path_index = -1
+
+		start_path = start_paths[best_start_path_index]
+		print("Starting path:")
+		if best_start_path_index >= 0:
+			print(start_labels[best_start_path_index] + ":", start_path)
+		else:
+			print("No start path found")
+		print("Starting cost:", best_start_path_cost)
+
+		build_start = time.time()
+		model, variables = self.build_model(model_G, model_homes, model_start, lazy_cuts, lemmas)
+		x = variables["x"]
+		if reduction is not None:
+			for i in reduction.fixed_edges():
+				x[i].ub = 0
+		build_time = time.time() - build_start
 
 		if "--no-model-start" not in params:
-			model.start = self.construct_starter(x, t, G, home_indices, start_path)
+			if self.formulation == "assign":
+				model.start = self.construct_assign_starter(x, variables["y"], variables["a"], model_G, model_homes, start_path)
+			else:
+				model.start = self.construct_starter(x, variables["t"], model_G, model_homes, start_path)
 
 		timeout = 300
 		if "-t" in params:
 			timeout = int(params[params.index("-t") + 1])
 
-		if timeout != -1:
+		if "--threads" in params:
+			model.threads = int(params[params.index("--threads") + 1])
+
+		# stop once the incumbent hasn't improved for this long
+		stall = None
+		if "--stall" in params:
+			stall = int(params[params.index("--stall") + 1])
+
+		target, cutoff = self.set_targets(model, input_file, edge_scale, params)
+		if target is not None or cutoff is not None:
+			print("Target cost: {}, cutoff: {}".format(target, cutoff))
+		self.log_update_entry(target=target, cutoff=cutoff)
+
+		solve_start = time.time()
+		bound = None
+		if lazy_cuts:
+			if self.incumbent is not None or stall is not None or target is not None:
+				print("The ILP restarts on its own with --lazy-cuts, so the shared tour, --stall and --target are not used")
+			status, bound = self.optimize_connected(model, x, model_G, model_start, timeout)
+		elif self.incumbent is not None or stall is not None or target is not None:
+			status = self.optimize_in_rounds(model, variables, model_G, model_homes, reduction, timeout, stall, edge_scale, target)
+		elif timeout != -1:
 			status = model.optimize(max_seconds=timeout)
 		else:
 			status = model.optimize()
+		solve_time = time.time() - solve_start
 
-		objective_value = model.objective_value / edge_scale
-		objective_bound = model.objective_bound / edge_scale
+		print("Model build time: {:.2f}s, solve time: {:.2f}s".format(build_time, solve_time))
+		self.log_phase("build", build_time)
+		self.log_phase("solve", solve_time)
+
+		# with a cutoff the model may have no solution, and no bound either if the cutoff makes it infeasible
+		objective_value = model.objective_value / edge_scale if model.num_solutions > 0 else float('inf')
+		if not lazy_cuts:
+			bound = model.objective_bound
+		objective_bound = bound / edge_scale if bound is not None else None
 
 		if status == OptimizationStatus.OPTIMAL:
 			print('optimal solution cost {} found'.format(objective_value))
-			self.log_update_entry(Fore.GREEN + "Optimal cost={}.".format(objective_value) + Style.RESET_ALL)
 		else:
 			print("!!!! TIMEOUT !!!!")
-			self.log_update_entry(Fore.RED + "Timeout!" + Style.RESET_ALL)
 
 			if status == OptimizationStatus.FEASIBLE:
 				print('sol.cost {} found, best possible: {}'.format(objective_value, objective_bound))
-				self.log_update_entry("Feasible cost={}, bound={}.".format(objective_value, objective_bound))
 			elif status == OptimizationStatus.NO_SOLUTION_FOUND:
 				print('no feasible solution found, lower bound is: {}'.format(objective_bound))
-				self.log_update_entry("Failed, bound={}.".format(objective_bound))
+
+		if not exact:
+			print("The {} lemma may cut off the optimum, so the result is not recorded as optimal".format(" and ".join(sorted(HEURISTIC_LEMMAS.intersection(lemmas)))))
+			objective_bound = None
+
+		self.log_update_entry(status=status.name.lower() if exact else "heuristic", formulation=self.formulation, lemmas=lemmas, bound=objective_bound)
+
+		# like its bound, the flow formulation's optimum ignores the car staying at the start, so it proves nothing
+		proven = exact and self.formulation == "assign" and status == OptimizationStatus.OPTIMAL
+		if exact and self.formulation != "assign" and status == OptimizationStatus.OPTIMAL:
+			print("The flow formulation never lets the car stay at the start, so the result is not recorded as optimal")
 
 		# if no solution found, return inf cost
 		if model.num_solutions == 0:
-			conn.close()
 			return float('inf'), [], {}
 
+		if objective_bound is not None:
+			self.log_update_entry(objective=objective_value, gap=(objective_value - objective_bound) / objective_value if objective_value else 0.0)
+		else:
+			self.log_update_entry(objective=objective_value)
+
 
 		# printing the solution if found
 		out.write('Route with total cost %g found. \n' % (objective_value))
@@ -476,24 +1113,22 @@ class ILPSolver(BaseSolver):
 				out.write(str(i.x) + '\t')
 
 			out.write('\n\nCar - Flow Capacities:\n')  
-			for i in f:
+			for i in variables.get("f", []):
 				out.write(str(i.x) + '\t')
 
 			out.write('\n\nTAs - Home Indices:\n')  
-			for i in H:
+			for i in home_indices:
 				out.write(str(i) + '\n')
 
-			out.write('\nTAs - Chosen Edges:\n')  
-			for i in t:
-				for j in range(len(i)):
-					out.write(str(i[j].x) + '\t')
-				out.write('\n') 
-
-			out.write('\nTAs - Flow Capacities:\n')  
-			for i in f_t:
-				for j in range(len(i)):
-					out.write(str(i[j].x) + '\t')
-				out.write('\n')
+			ta_groups = [("t", "TAs - Chosen Edges"), ("f_t", "TAs - Flow Capacities"), ("a", "TAs - Dropoff Vertices")]
+			for name, label in ta_groups:
+				if name not in variables:
+					continue
+				out.write('\n' + label + ':\n')  
+				for i in variables[name]:
+					for j in range(len(i)):
+						out.write(str(i[j].x) + '\t')
+					out.write('\n')
 
 			out.write('\nActive Edges:\n')  
 
@@ -503,28 +1138,26 @@ class ILPSolver(BaseSolver):
 			out.write('\n')
 
 		list_of_edges = [E[i] for i in range(len(x)) if x[i].x >= 1.0]
-		car_path_indices = self.construct_path(starting_car_index, list_of_edges, input_file)
-		
-		walk_cost, dropoffs_dict = self.find_best_dropoffs(G, home_indices, car_path_indices)
-		updated = False
-		if not seen:
-			print("SAVING", input_file)
-			c.execute('INSERT INTO models (input_file, best_objective_bound, optimal) VALUES (?, ?, ?)', \
-				(input_file, objective_value, status == OptimizationStatus.OPTIMAL))
-			conn.commit()
-		elif objective_value <= seen[0]:
-			updated = True
-			print("UPDATING", input_file)
-			c.execute('UPDATE models SET best_objective_bound = ?, optimal = ? WHERE input_file = ?', \
-				(objective_value, status == OptimizationStatus.OPTIMAL, input_file))
-			conn.commit()
+
+		# the path check and the new result are written together
+		with store.transaction():
+			car_path_indices = self.construct_path(model_start, list_of_edges, input_file)
+			if reduction is not None:
+				car_path_indices = reduction.expand_path(car_path_indices)
+			walk_cost, dropoffs_dict = self.find_best_dropoffs(G, home_indices, car_path_indices)
+			written = store.record(input_file, objective_value, proven)
+			store.record_solution(input_file, car_path_indices, dropoffs_dict, objective_value, objective_bound)
+			# the flow formulation only drops TAs off where the car drives in, so it never lets the car stay at the start
+			# and its bound is no bound on the problem
+			if objective_bound is not None and self.formulation == "assign":
+				store.record_bound(input_file, "mip", objective_bound)
+
+		updated = bool(seen) and written
+		if written:
+			print("UPDATING" if seen else "SAVING", input_file)
 		if not "-s" in params:
 			print("Walk cost =", walk_cost, "\n")
 
-		if updated:
-			self.log_update_entry(Fore.GREEN + "Updated" + Style.RESET_ALL)
-		else:
-			self.log_update_entry(Fore.RED + "Not Updated" + Style.RESET_ALL)
+		self.log_update_entry(updated=updated)
 
-		conn.close()
 		return objective_value, car_path_indices, dropoffs_dict
\ No newline at end of file
@@ -5,6 +5,8 @@ import shutil
 import os
 
 from output_validator import *
+from input_cache import read_input
+from results_store import ResultsStore
 
 def print_local_table(filename):
     conn = sqlite3.connect(filename)
@@ -176,10 +178,37 @@ def discrepancy_check(filename, allowance):
     logfile.close()
     conn.close()
 
+def import_solutions(filename):
+    store = ResultsStore(filename)
+    input_folder = "batches/inputs/"
+    output_directory = "submissions/submission_final/"
+
+    print("Storing the tours in {} as warm starts...".format(output_directory))
+
+    count = 0
+    with store.transaction():
+        for entry in os.scandir(output_directory):
+            input_file_name = entry.name.split('.')[0] + ".in"
+            if not entry.name.endswith('.out') or not os.path.exists(input_folder + input_file_name):
+                continue
+
+            parsed_input = read_input(input_folder + input_file_name)
+            list_of_locations = parsed_input[2]
+            output_data = utils.read_file(entry.path)
+            cost, message = tests(None, output_data, parsed_input=parsed_input)
+            if cost != 'infinite':
+                car_path = list_of_locations.indices(output_data[0])
+                dropoffs = {list_of_locations.index(line[0]): list_of_locations.indices(line[1:]) for line in output_data[2:]}
+                store.record_solution(input_file_name, car_path, dropoffs, cost)
+                count += 1
+
+    store.close()
+    print("Stored {} solutions.".format(count))
+
 
 if __name__=="__main__":
     parser = argparse.ArgumentParser(description='Parsing arguments')
-    parser.add_argument('command', type=str, choices=['print', 'merge', 'query', 'remaining', 'discrepancy', 'split'], help='The command to run')
+    parser.add_argument('command', type=str, choices=['print', 'merge', 'query', 'remaining', 'discrepancy', 'split', 'solutions'], help='The command to run')
     parser.add_argument('input', type=str, help='The path to the input table')
     parser.add_argument('params', nargs=argparse.REMAINDER, help='Extra arguments passed in')
     args = parser.parse_args()
@@ -199,5 +228,7 @@ if __name__=="__main__":
         discrepancy_check(args.input, allowance)
     elif args.command == 'split':
         split(args.input)
+    elif args.command == 'solutions':
+        import_solutions(args.input)
     else:
         print("Unsupported command")
\ No newline at end of file
@@ -1,5 +1,7 @@
 import networkx as nx
 import numpy as np
+from distance_oracle import get_oracle
+from location_index import LocationIndex, get_location_index
 
 
 def decimal_digits_check(number):
@@ -14,7 +16,7 @@ def decimal_digits_check(number):
 def data_parser(input_data):
     number_of_locations = int(input_data[0][0])
     number_of_houses = int(input_data[1][0])
-    list_of_locations = input_data[2]
+    list_of_locations = LocationIndex(input_data[2])
     list_of_houses = input_data[3]
     starting_location = input_data[4][0]
 
@@ -24,12 +26,19 @@ def data_parser(input_data):
 
 def adjacency_matrix_to_graph(adjacency_matrix, scale = 1.0):
     node_weights = [adjacency_matrix[i][i] for i in range(len(adjacency_matrix))]
-    adjacency_matrix_formatted = [[0 if entry == 'x' else entry * scale for entry in row] for row in adjacency_matrix]
 
-    for i in range(len(adjacency_matrix_formatted)):
-        adjacency_matrix_formatted[i][i] = 0
+    # matrices read through input_cache carry their float array, with inf in place of 'x'
+    weights = getattr(adjacency_matrix, 'weights', None)
+    if weights is None:
+        weights = np.array([[np.inf if entry == 'x' else entry for entry in row] for row in adjacency_matrix], dtype=float)
+    adjacency_matrix_formatted = np.where(np.isinf(weights), 0, weights * scale)
+    np.fill_diagonal(adjacency_matrix_formatted, 0)
 
-    G = nx.convert_matrix.from_numpy_matrix(np.matrix(adjacency_matrix_formatted))
+    # same nodes, edges and adjacency order as nx.from_numpy_matrix, without its per-entry Python loop
+    G = nx.Graph()
+    G.add_nodes_from(range(len(adjacency_matrix_formatted)))
+    rows, cols = np.nonzero(adjacency_matrix_formatted)
+    G.add_weighted_edges_from(zip(rows.tolist(), cols.tolist(), adjacency_matrix_formatted[rows, cols].tolist()))
 
     message = ''
 
@@ -94,11 +103,11 @@ def cost_of_solution(G, car_cycle, dropoff_mapping):
         else:
             driving_cost = 0
         walking_cost = 0
-        shortest = dict(nx.floyd_warshall(G))
+        shortest = get_oracle(G).dist
 
         for drop_location in dropoffs:
             for house in dropoff_mapping[drop_location]:
-                walking_cost += shortest[drop_location][house]
+                walking_cost += float(shortest[drop_location][house])
 
         message += f'The driving cost of your solution is {driving_cost}.\n'
         message += f'The walking cost of your solution is {walking_cost}.\n'
@@ -109,4 +118,4 @@ def cost_of_solution(G, car_cycle, dropoff_mapping):
 
 
 def convert_locations_to_indices(list_to_convert, list_of_locations):
-    return [list_of_locations.index(name) if name in list_of_locations else None for name in list_to_convert]
+    return get_location_index(list_of_locations).indices(list_to_convert)
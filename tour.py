@@ -0,0 +1,160 @@
+# metric TSP heuristics, and exact tours of small vertex sets, on the shortest path closure of a graph
+
+import numpy as np
+
+def tour_length(dist, tour):
+	"""
+	Input:
+		dist: All-pairs shortest distance matrix
+		tour: List of vertices, starting and ending at the same vertex
+	Output:
+		Total distance driven around the tour
+	"""
+	return float(sum(dist[u][v] for u, v in zip(tour, tour[1:])))
+
+def nearest_neighbour_tour(dist, start, vertices):
+	"""
+	Build a tour by always driving to the closest unvisited vertex.
+	Input:
+		dist: All-pairs shortest distance matrix
+		start: The vertex the tour starts and ends at
+		vertices: The other vertices the tour must visit
+	Output:
+		List of vertices, starting and ending at start
+	"""
+	tour = [start]
+	remaining = set(vertices) - {start}
+	while remaining:
+		curr = min(remaining, key=lambda v: dist[tour[-1]][v])
+		remaining.remove(curr)
+		tour.append(curr)
+	return tour + [start]
+
+def two_opt(dist, tour):
+	"""
+	Reverse segments of the tour while doing so shortens it. Distances must be symmetric.
+	Input:
+		dist: All-pairs shortest distance matrix
+		tour: List of vertices, starting and ending at the same vertex
+	Output:
+		The improved tour
+	"""
+	tour = list(tour)
+	improved = True
+	while improved:
+		improved = False
+		for i in range(1, len(tour) - 2):
+			for j in range(i + 1, len(tour) - 1):
+				a, b, c, d = tour[i - 1], tour[i], tour[j], tour[j + 1]
+				if dist[a][c] + dist[b][d] < dist[a][b] + dist[c][d] - 1e-9:
+					tour[i:j + 1] = tour[i:j + 1][::-1]
+					improved = True
+	return tour
+
+def or_opt(dist, tour, max_segment=3):
+	"""
+	Move short segments of the tour to the position where they are cheapest to visit.
+	Input:
+		dist: All-pairs shortest distance matrix
+		tour: List of vertices, starting and ending at the same vertex
+		max_segment: Longest segment that is moved
+	Output:
+		The improved tour
+	"""
+	tour = list(tour)
+	improved = True
+	while improved:
+		improved = False
+		for length in range(1, max_segment + 1):
+			for i in range(1, len(tour) - length):
+				segment = tour[i:i + length]
+				before, after = tour[i - 1], tour[i + length]
+				removed = dist[before][segment[0]] + dist[segment[-1]][after] - dist[before][after]
+				rest = tour[:i] + tour[i + length:]
+
+				best_gain, best_position, best_segment = 1e-9, None, None
+				for j in range(len(rest) - 1):
+					a, b = rest[j], rest[j + 1]
+					for candidate in (segment, segment[::-1]):
+						gain = removed - (dist[a][candidate[0]] + dist[candidate[-1]][b] - dist[a][b])
+						if gain > best_gain:
+							best_gain, best_position, best_segment = gain, j + 1, candidate
+
+				if best_position is not None:
+					tour = rest[:best_position] + best_segment + rest[best_position:]
+					improved = True
+					break
+			if improved:
+				break
+	return tour
+
+def improve_tour(dist, tour):
+	""" Alternate 2-opt and Or-opt until neither shortens the tour """
+	length = tour_length(dist, tour)
+	while True:
+		tour = or_opt(dist, two_opt(dist, tour))
+		new_length = tour_length(dist, tour)
+		if new_length >= length - 1e-9:
+			return tour
+		length = new_length
+
+def expand_tour(oracle, tour):
+	"""
+	Replace each hop of a closure tour with its shortest path, giving a walk along the graph's edges.
+	Input:
+		oracle: DistanceOracle of the graph
+		tour: List of vertices, starting and ending at the same vertex
+	Output:
+		List of vertices of the walk
+	"""
+	walk = tour[:1]
+	for u, v in zip(tour, tour[1:]):
+		walk += oracle.path(u, v)[1:]
+	return walk
+
+def held_karp(dist, start, vertices):
+	"""
+	Shortest tour through a set of vertices, by dynamic programming over subsets (Held–Karp).
+	Takes O(2^k k^2) time and O(2^k k) memory for k vertices, so only use it for up to about 16.
+	Input:
+		dist: All-pairs shortest distance matrix, as a NumPy array
+		start: The vertex the tour starts and ends at
+		vertices: The other vertices the tour must visit
+	Output:
+		Length of the shortest tour
+		List of vertices, starting and ending at start
+	"""
+	vertices = [v for v in dict.fromkeys(vertices) if v != start]
+	k = len(vertices)
+	if k == 0:
+		return 0.0, [start]
+	d = dist[np.ix_(vertices, vertices)]
+
+	# cost[S, j] is the shortest path from start through the vertices in bitmask S, ending at j in S
+	masks = np.arange(1 << k)
+	bits = (masks[:, np.newaxis] >> np.arange(k)) & 1
+	size = bits.sum(axis=1)
+	cost = np.full((1 << k, k), np.inf)
+	parent = np.full((1 << k, k), -1, dtype=np.int64)
+	cost[1 << np.arange(k), np.arange(k)] = dist[start, vertices]
+
+	for n in range(1, k):
+		layer = masks[size == n]
+		through = cost[layer][:, :, np.newaxis] + d[np.newaxis, :, :]
+		last = through.argmin(axis=1)
+		extended = np.take_along_axis(through, last[:, np.newaxis, :], axis=1)[:, 0, :]
+		for j in range(k):
+			free = bits[layer, j] == 0
+			targets = layer[free] | (1 << j)
+			cost[targets, j] = extended[free, j]
+			parent[targets, j] = last[free, j]
+
+	# close the tour, then walk the parents back from the full set
+	closing = cost[-1] + dist[vertices, start]
+	j, mask = int(np.argmin(closing)), (1 << k) - 1
+	length = float(closing[j])
+	order = []
+	while j != -1:
+		order.append(vertices[j])
+		j, mask = int(parent[mask, j]), mask ^ (1 << j)
+	return length, [start] + order[::-1] + [start]
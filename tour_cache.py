@@ -0,0 +1,88 @@
+# shortest car tours through sets of vertices, cached per graph so a set's tour is only computed once
+
+import weakref
+from collections import OrderedDict
+from distance_oracle import get_oracle
+from tour import tour_length, nearest_neighbour_tour, improve_tour, expand_tour, held_karp
+
+# Sets of up to this many vertices besides the start are toured exactly by Held–Karp, larger ones heuristically
+EXACT_TOUR_VERTICES = 16
+
+# Number of tours kept, the least recently used are evicted first
+TOUR_CACHE_SIZE = 100000
+
+class TourCache:
+	""" Tours through the start and a set of vertices on the shortest path closure of a graph, keyed by the set """
+
+	def __init__(self, G, exact_vertices=EXACT_TOUR_VERTICES, max_size=TOUR_CACHE_SIZE):
+		"""
+		Input:
+			G: A NetworkX graph with integer nodes 0..n-1
+			exact_vertices: Largest set, besides the start, toured exactly
+			max_size: Number of tours kept
+		"""
+		self.oracle = get_oracle(G)
+		self.exact_vertices = exact_vertices
+		self.max_size = max_size
+		self.tours = OrderedDict()
+		self.hits = self.misses = 0
+
+		# the heuristics index nested lists much faster than NumPy arrays
+		self.dist_list = None
+
+	def lookup(self, start, vertices):
+		"""
+		Input:
+			start: The vertex the tour starts and ends at
+			vertices: The other vertices the tour must visit, in any order
+		Output:
+			Length of the tour
+			List of vertices on the closure, starting and ending at start
+			Whether the tour is the shortest one
+		"""
+		key = (start, frozenset(vertices) - {start})
+		result = self.tours.get(key)
+		if result is not None:
+			self.hits += 1
+			self.tours.move_to_end(key)
+			return result
+
+		self.misses += 1
+		if len(key[1]) <= self.exact_vertices:
+			length, tour = held_karp(self.oracle.dist, start, sorted(key[1]))
+			result = (length, tour, True)
+		else:
+			if self.dist_list is None:
+				self.dist_list = self.oracle.dist.tolist()
+			tour = improve_tour(self.dist_list, nearest_neighbour_tour(self.dist_list, start, sorted(key[1])))
+			result = (tour_length(self.dist_list, tour), tour, False)
+
+		self.tours[key] = result
+		if len(self.tours) > self.max_size:
+			self.tours.popitem(last=False)
+		return result
+
+	def length(self, start, vertices):
+		""" Length of the tour through start and vertices """
+		return self.lookup(start, vertices)[0]
+
+	def walk(self, start, vertices):
+		""" The tour through start and vertices as a closed walk along the graph's edges """
+		return expand_tour(self.oracle, self.lookup(start, vertices)[1])
+
+# Caches are keyed by graph identity, so graphs must not be mutated after their first lookup
+_tour_caches = weakref.WeakKeyDictionary()
+
+def get_tour_cache(G):
+	"""
+	Fetch the tour cache for G, creating it on first use.
+	Input:
+		G: A NetworkX graph with integer nodes 0..n-1
+	Output:
+		TourCache shared by every caller holding the same graph object
+	"""
+	cache = _tour_caches.get(G)
+	if cache is None:
+		cache = TourCache(G)
+		_tour_caches[G] = cache
+	return cache
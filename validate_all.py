@@ -0,0 +1,137 @@
+# validates every input and its output across a pool of processes, writing one report with each file's cost, validity and timing
+
+import os
+import csv
+import json
+import time
+import argparse
+import multiprocessing
+import utils
+import input_validator
+import output_validator
+from input_cache import read_input, file_digest
+from results_store import get_store
+
+DEFAULT_REPORT = 'validation_report.json'
+
+# Columns of the report, in order
+FIELDS = ["input_file", "output_file", "input_valid", "output_valid", "cost", "cached", "seconds", "message"]
+
+def check_input(input_file, parsed_input, params=[]):
+	"""
+	Validate an input, reusing the stored result of the content checks for a file with the same contents checked by the same validator version.
+	Input:
+		input_file: path to the .in file
+		parsed_input: The input's data_parser tuple
+		params: Extra arguments, --any-name skips the checks on the file's name
+	Output:
+		Whether the input is valid, the validator's message, and whether the content checks were cached
+	"""
+	store = get_store()
+
+	# results of an older validator are keyed differently, so they are never reused
+	key = '{}-{}'.format(file_digest(input_file), input_validator.VALIDATOR_VERSION)
+	cached = store.input_check(key)
+	if cached is None:
+		message, error = input_validator.content_tests(parsed_input)
+		store.set_input_check(key, not error, message)
+		valid = not error
+	else:
+		valid, message = cached
+
+	if "--any-name" not in params:
+		name_message, name_error = input_validator.name_tests(input_file, parsed_input[0])
+		message, valid = name_message + message, valid and not name_error
+	return valid, message, cached is not None
+
+def validate_pair(task):
+	"""
+	Validate one input and its output, parsing the input once for both.
+	Input:
+		task: (input_file, output_file or None, params)
+	Output:
+		The input's row of the report
+	"""
+	input_file, output_file, params = task
+	start = time.time()
+	row = {"input_file": input_file, "output_file": output_file, "input_valid": False, "output_valid": None, "cost": None, "cached": False}
+	try:
+		parsed_input = read_input(input_file)
+		row["input_valid"], message, row["cached"] = check_input(input_file, parsed_input, params)
+		if output_file is not None:
+			cost, output_message = output_validator.tests(None, utils.read_file(output_file), params=params, parsed_input=parsed_input)
+			row["output_valid"] = row["input_valid"] and cost != 'infinite'
+			row["cost"] = cost if cost != 'infinite' else None
+			message += output_message
+	except Exception as e:
+		message = 'Validation failed: {}\n'.format(e)
+	row["seconds"] = round(time.time() - start, 4)
+	row["message"] = message.strip()
+	return row
+
+def validate_all(input_directory, output_directory=None, params=[], jobs=1):
+	"""
+	Input:
+		input_directory: The directory of .in files
+		output_directory: The directory of .out files, or None to validate the inputs only
+		params: Extra arguments passed to the validators
+		jobs: number of worker processes
+	Output:
+		The rows of the report, ordered by input file
+	"""
+	tasks = []
+	for input_file in sorted(utils.get_files_with_extension(input_directory, '.in')):
+		output_file = None
+		if output_directory is not None:
+			output_file = utils.input_to_output(input_file, output_directory)
+			if not os.path.exists(output_file):
+				output_file = None
+		tasks.append((input_file, output_file, params))
+
+	if jobs > 1:
+		with multiprocessing.Pool(jobs) as pool:
+			rows = list(pool.imap_unordered(validate_pair, tasks, chunksize=8))
+	else:
+		rows = list(map(validate_pair, tasks))
+
+	# an output directory without the input's output is an error of its own
+	if output_directory is not None:
+		for row in rows:
+			if row["output_file"] is None:
+				row["output_valid"] = False
+				row["message"] += '\nNo corresponding .out file for {}'.format(row["input_file"])
+	return sorted(rows, key=lambda row: row["input_file"])
+
+def write_report(rows, path):
+	""" Write the rows as CSV if the path ends in .csv, and as JSON otherwise """
+	if path.endswith('.csv'):
+		with open(path, 'w', newline='') as f:
+			writer = csv.DictWriter(f, fieldnames=FIELDS)
+			writer.writeheader()
+			writer.writerows(rows)
+	else:
+		with open(path, 'w') as f:
+			json.dump(rows, f, indent=1)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Validate every input, and optionally every output, in parallel')
+	parser.add_argument('input_directory', type=str, help='The directory of input files')
+	parser.add_argument('output_directory', type=str, nargs='?', default=None, help='The directory of output files')
+	parser.add_argument('--jobs', dest='jobs', type=int, default=multiprocessing.cpu_count(), help='Number of files validated at once')
+	parser.add_argument('--report', dest='report', type=str, default=DEFAULT_REPORT, help='The report file, CSV if it ends in .csv and JSON otherwise')
+
+	# every other argument is passed to the validators
+	args, params = parser.parse_known_args()
+
+	start = time.time()
+	rows = validate_all(args.input_directory, args.output_directory, params, args.jobs)
+	write_report(rows, args.report)
+
+	invalid_inputs = [row["input_file"] for row in rows if not row["input_valid"]]
+	print("{} inputs validated in {:.2f}s, {} with cached checks, {} invalid".format(len(rows), time.time() - start,
+		sum(1 for row in rows if row["cached"]), len(invalid_inputs)))
+	if args.output_directory is not None:
+		print("{} outputs invalid".format(sum(1 for row in rows if not row["output_valid"])))
+	for input_file in invalid_inputs[:20]:
+		print("  invalid:", input_file)
+	print("Report written to", args.report)